@@ -0,0 +1,506 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import ip_utils
+from router import Router
+from scheduler import (
+    DrrScheduler,
+    Packet,
+    PriorityScheduler,
+    WfqScheduler,
+    payload_size,
+    priority_scheduler,
+)
+
+
+# Share of each prefix length in a real-world IPv4 BGP table: /24s are
+# well over half the table, and /22-/23 and /19-/21 most of the rest.
+PREFIX_LENGTH_SHARES = {
+    8: 0.0001, 11: 0.0002, 12: 0.0006, 13: 0.0012, 14: 0.0025, 15: 0.004,
+    16: 0.013, 17: 0.008, 18: 0.014, 19: 0.025, 20: 0.04, 21: 0.045,
+    22: 0.11, 23: 0.095, 24: 0.62, 25: 0.002, 26: 0.002, 27: 0.001,
+    28: 0.001, 29: 0.001, 30: 0.001, 32: 0.001,
+}
+
+
+def random_routes(count: int, seed: int = 1) -> list:
+    """
+    Generates `count` distinct random IPv4 routes whose prefix lengths
+    follow PREFIX_LENGTH_SHARES.
+    """
+    rng = random.Random(seed)
+    lengths = list(PREFIX_LENGTH_SHARES)
+    shares = list(PREFIX_LENGTH_SHARES.values())
+    seen = set()
+    routes = []
+    while len(routes) < count:
+        length = rng.choices(lengths, shares)[0]
+        network = rng.getrandbits(32) & ip_utils.prefix_mask(length)
+        if (network, length) in seen:
+            continue
+        seen.add((network, length))
+        routes.append((f"{ip_utils.int_to_ip(network)}/{length}", f"Link {len(routes) % 64}"))
+    return routes
+
+
+def random_addresses(count: int, seed: int = 2) -> list:
+    """
+    Generates `count` random dotted-decimal destination addresses.
+    """
+    rng = random.Random(seed)
+    return [".".join(str(rng.getrandbits(8)) for _ in range(4)) for _ in range(count)]
+
+
+def random_routes6(count: int, seed: int = 1) -> list:
+    """
+    Generates `count` distinct random IPv6 routes inside 2000::/3,
+    mostly /48 to /64 like a real IPv6 table.
+    """
+    rng = random.Random(seed)
+    lengths = [32, 36, 40, 44, 48, 48, 48, 48, 52, 56, 56, 64, 64, 64, 128]
+    seen = set()
+    routes = []
+    while len(routes) < count:
+        length = rng.choice(lengths)
+        network = ((1 << 125) | rng.getrandbits(125)) & ip_utils.prefix_mask6(length)
+        if (network, length) in seen:
+            continue
+        seen.add((network, length))
+        routes.append((f"{ip_utils.int_to_ipv6(network)}/{length}", f"Link {len(routes) % 64}"))
+    return routes
+
+
+def random_addresses6(count: int, routes: list, seed: int = 2) -> list:
+    """
+    Generates `count` IPv6 destinations: random hosts inside the given
+    routes, so lookups walk deep into the trie instead of missing early.
+    """
+    rng = random.Random(seed)
+    networks = [ip_utils.parse_cidr6(cidr)[0] for cidr, _ in routes]
+    return [
+        ip_utils.int_to_ipv6(rng.choice(networks) | rng.getrandbits(64))
+        for _ in range(count)
+    ]
+
+
+def zipf_addresses(count: int, routes: list, exponent: float = 1.0,
+                   distinct: int = 100_000, seed: int = 3) -> list:
+    """
+    Draws `count` destinations from `distinct` addresses with Zipf
+    (1/rank**exponent) popularity, so a few destinations carry most of
+    the traffic. Nine in ten addresses are hosts inside a route; the rest
+    are random and usually fall through to the default gateway.
+    """
+    rng = random.Random(seed)
+    networks = [ip_utils.parse_cidr(cidr) for cidr, _ in routes]
+    pool = []
+    for _ in range(distinct):
+        if networks and rng.random() < 0.9:
+            network, mask, _ = rng.choice(networks)
+            address = network | (rng.getrandbits(32) & ~mask & 0xFFFFFFFF)
+        else:
+            address = rng.getrandbits(32)
+        pool.append(ip_utils.int_to_ip(address))
+    weights = [rank ** -exponent for rank in range(1, distinct + 1)]
+    return rng.choices(pool, weights, k=count)
+
+
+def random_packets(count: int, seed: int = 4) -> list:
+    """
+    Generates `count` packets with random priorities 0-2 and payloads of
+    64 to 1499 bytes.
+    """
+    rng = random.Random(seed)
+    return [
+        Packet("10.0.0.1", "10.0.0.2", "x" * rng.randrange(64, 1500), rng.randrange(3))
+        for _ in range(count)
+    ]
+
+
+def traced_bytes(build) -> int:
+    """
+    Returns the bytes still allocated by `build()` once it has returned,
+    i.e. the size of whatever it built.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def rate(count: int, seconds: float) -> float:
+    return count / seconds if seconds > 0 else float("inf")
+
+
+def bench_ip_utils(count: int) -> dict:
+    """
+    Times the string and integer address conversions of ip_utils.
+    """
+    addresses = random_addresses(count)
+    packed = [ip_utils.ip_to_int(ip).to_bytes(4, "big") for ip in addresses]
+    cidrs = [f"{ip}/24" for ip in addresses]
+    result = {}
+    for name, func, inputs in (
+        ("ip_to_binary", ip_utils.ip_to_binary, addresses),
+        ("parse_address_str", ip_utils.parse_address, addresses),
+        ("parse_address_packed", ip_utils.parse_address, packed),
+        ("parse_cidr", ip_utils.parse_cidr, cidrs),
+    ):
+        start = time.perf_counter()
+        for value in inputs:
+            func(value)
+        result[f"{name}_per_s"] = rate(count, time.perf_counter() - start)
+    return result
+
+
+def bench_router(route_count: int, lookups: int, cache_size: int = 0, exponent: float = 1.0) -> dict:
+    """
+    Builds a router with `route_count` routes and times `lookups`
+    route_packet calls over Zipf-skewed destinations. Also reports the
+    memory the router holds per route.
+    """
+    routes = random_routes(route_count)
+    addresses = zipf_addresses(lookups, routes, exponent)
+
+    start = time.perf_counter()
+    router = Router(routes, cache_size=cache_size)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for ip in addresses:
+        router.route_packet(ip)
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "build_s": build_time,
+        "bytes_per_route": traced_bytes(lambda: Router(routes)) / route_count,
+        "lookups_per_s": rate(lookups, elapsed),
+    }
+    if router.cache is not None:
+        result["cache"] = router.cache.stats()
+    return result
+
+
+def bench_router6(route_count: int, lookups: int) -> dict:
+    """
+    Same as bench_router for an IPv6-only table.
+    """
+    routes = random_routes6(route_count)
+    addresses = random_addresses6(lookups, routes)
+
+    start = time.perf_counter()
+    router = Router(routes)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for ip in addresses:
+        router.route_packet(ip)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "build_s": build_time,
+        "bytes_per_route": traced_bytes(lambda: Router(routes)) / route_count,
+        "lookups_per_s": rate(lookups, elapsed),
+    }
+
+
+def bench_batch(route_count: int, lookups: int) -> dict:
+    """
+    Times route_batch over a uint32 array of `lookups` Zipf-skewed
+    destinations, separately from building its DIR-24-8 tables.
+    """
+    import numpy as np
+
+    routes = random_routes(route_count)
+    router = Router(routes)
+    addresses = np.fromiter(
+        (ip_utils.ip_to_int(ip) for ip in zipf_addresses(lookups, routes)), dtype=np.uint32
+    )
+
+    # The first call builds the DIR-24-8 tables
+    start = time.perf_counter()
+    router.route_batch(addresses[:1])
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    router.route_batch(addresses)
+    elapsed = time.perf_counter() - start
+
+    return {"table_build_s": build_time, "lookups_per_s": rate(lookups, elapsed)}
+
+
+def bench_fib(route_count: int, lookups: int) -> dict:
+    """
+    Compiles a router with `route_count` routes to a FIB file, then times
+    mapping it and looking up from the mapped tables.
+    """
+    from fib import load_fib, write_fib
+
+    routes = random_routes(route_count)
+    addresses = zipf_addresses(lookups, routes)
+    router = Router(routes)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.fib")
+        start = time.perf_counter()
+        write_fib(router, path)
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fib = load_fib(path)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for ip in addresses:
+            fib.route_packet(ip)
+        elapsed = time.perf_counter() - start
+        fib.close()
+
+    return {"write_s": write_time, "load_s": load_time, "lookups_per_s": rate(lookups, elapsed)}
+
+
+def bench_updates(route_count: int, updates: int, readers: int) -> dict:
+    """
+    Applies `updates` add/withdraw pairs to a router with `route_count`
+    routes while `readers` threads call route_packet in a loop.
+    """
+    routes = random_routes(route_count + updates)
+    router = Router(routes[:route_count])
+    addresses = zipf_addresses(10_000, routes)
+    stop = threading.Event()
+    counts = [0] * readers
+
+    def reader(slot: int):
+        while not stop.is_set():
+            for ip in addresses:
+                router.route_packet(ip)
+            counts[slot] += len(addresses)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+
+    start = time.perf_counter()
+    for cidr, link in routes[route_count:]:
+        router.add_route(cidr, link)
+        router.withdraw_route(cidr)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return {
+        "updates_per_s": rate(2 * updates, elapsed),
+        "reader_lookups_per_s": rate(sum(counts), elapsed),
+    }
+
+
+def bench_scheduler(count: int) -> dict:
+    """
+    Compares the sort-based priority_scheduler with PriorityScheduler on
+    `count` packets, both as one offline batch and as a live queue that
+    dequeues one packet for every two that arrive.
+    """
+    packets = random_packets(count)
+    result = {
+        # Payload strings are excluded: only the Packet objects themselves
+        "bytes_per_packet": sum(sys.getsizeof(p) for p in packets) / count,
+    }
+
+    start = time.perf_counter()
+    priority_scheduler(packets)
+    result["sorted_per_s"] = rate(count, time.perf_counter() - start)
+
+    scheduler = PriorityScheduler()
+    start = time.perf_counter()
+    for packet in packets:
+        scheduler.enqueue(packet)
+    result["enqueue_per_s"] = rate(count, time.perf_counter() - start)
+    start = time.perf_counter()
+    while scheduler:
+        scheduler.dequeue()
+    result["dequeue_per_s"] = rate(count, time.perf_counter() - start)
+
+    scheduler = PriorityScheduler()
+    start = time.perf_counter()
+    for i, packet in enumerate(packets):
+        scheduler.enqueue(packet)
+        if i & 1:
+            scheduler.dequeue()
+    while scheduler:
+        scheduler.dequeue()
+    result["live_per_s"] = rate(count, time.perf_counter() - start)
+
+    try:
+        from packet_batch import PacketBatch, priority_schedule
+    except ImportError:
+        return result
+    batch = PacketBatch.from_packets(packets)
+    start = time.perf_counter()
+    priority_schedule(batch)
+    result["columnar_per_s"] = rate(count, time.perf_counter() - start)
+    return result
+
+
+def jain_index(shares: list) -> float:
+    """
+    Jain's fairness index: 1.0 when all shares are equal, 1/n when one
+    class gets everything.
+    """
+    total = sum(shares)
+    squares = sum(share * share for share in shares)
+    return total * total / (len(shares) * squares) if squares else 1.0
+
+
+def bench_fair_schedulers(count: int, weights: dict) -> dict:
+    """
+    Enqueues `count` packets and dequeues them all with each discipline.
+    Fairness is Jain's index of bytes served per unit of weight over the
+    first 20% of departures, while every class is still backlogged.
+    """
+    packets = random_packets(count)
+    window = count // 5
+    results = {}
+
+    for name, scheduler in (
+        ("priority", PriorityScheduler()),
+        ("drr", DrrScheduler(weights)),
+        ("wfq", WfqScheduler(weights)),
+    ):
+        for packet in packets:
+            scheduler.enqueue(packet)
+
+        served = dict.fromkeys(weights, 0)
+        start = time.perf_counter()
+        for i in range(count):
+            packet = scheduler.dequeue()
+            if i < window:
+                served[packet.priority] += payload_size(packet)
+        elapsed = time.perf_counter() - start
+
+        results[name] = {
+            "dequeue_per_s": rate(count, elapsed),
+            "fairness": jain_index([served[cls] / weight for cls, weight in weights.items()]),
+        }
+
+    return results
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """
+    Flattens nested results to {"section.key.metric": value}.
+    """
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def git_commit() -> str:
+    """
+    Returns the short hash of the checked-out commit, if there is one.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_suite(args) -> dict:
+    """
+    Runs the selected benchmarks and returns their results with enough
+    metadata to tell runs apart.
+    """
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "sizes": args.sizes,
+            "lookups": args.lookups,
+            "packets": args.packets,
+        },
+        "ip_utils": bench_ip_utils(args.lookups),
+        "router": {str(size): bench_router(size, args.lookups, args.cache, args.zipf)
+                   for size in args.sizes},
+    }
+
+    if args.ipv6 or args.all:
+        results["router6"] = {str(size): bench_router6(size, args.lookups) for size in args.sizes}
+    if args.batch or args.all:
+        results["batch"] = {str(size): bench_batch(size, args.batch or 1_000_000) for size in args.sizes}
+    if args.fib or args.all:
+        results["fib"] = {str(size): bench_fib(size, args.lookups) for size in args.sizes}
+    if args.updates or args.all:
+        results["updates"] = {str(size): bench_updates(size, args.updates or 10_000, args.readers)
+                              for size in args.sizes}
+
+    results["scheduler"] = bench_scheduler(args.packets)
+    results["fair_schedulers"] = bench_fair_schedulers(args.packets, {0: 4, 1: 2, 2: 1})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CN Lab 8 routing and scheduling benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000],
+                        help="Route table sizes to benchmark")
+    parser.add_argument("--lookups", type=int, default=200_000, help="Lookups per table size")
+    parser.add_argument("--zipf", type=float, default=1.0, help="Zipf exponent of destination popularity")
+    parser.add_argument("--cache", type=int, default=0, help="Route cache size for the route_packet benchmark")
+    parser.add_argument("--packets", type=int, default=200_000, help="Packets for the scheduler benchmarks")
+    parser.add_argument("--ipv6", action="store_true", help="Also benchmark IPv6 route_packet")
+    parser.add_argument("--batch", type=int, default=0,
+                        help="Also benchmark route_batch with this many addresses (needs NumPy)")
+    parser.add_argument("--fib", action="store_true",
+                        help="Also benchmark startup and lookups from a memory-mapped FIB file")
+    parser.add_argument("--updates", type=int, default=0,
+                        help="Also benchmark this many add/withdraw pairs under lookup load")
+    parser.add_argument("--readers", type=int, default=2, help="Lookup threads for --updates")
+    parser.add_argument("--all", action="store_true", help="Run every optional benchmark")
+    parser.add_argument("--json", metavar="PATH", help="Write the results as JSON to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with results saved by an earlier --json run")
+    args = parser.parse_args()
+
+    results = run_suite(args)
+    current = flatten(results)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = flatten(json.load(f))
+
+    for name, value in current.items():
+        if name.startswith("meta."):
+            continue
+        line = f"{name:<45} {value:>16,.3f}" if isinstance(value, float) else f"{name:<45} {value:>16,}"
+        old = baseline.get(name)
+        if isinstance(old, (int, float)) and old:
+            line += f"   {(value - old) / old:+.1%} vs {baseline.get('meta.commit') or args.compare}"
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
@@ -0,0 +1,135 @@
+import numpy as np
+
+# Entries in both tables are 0 for "no route" or (value + 1).
+# A tbl24 entry with EXTENDED set instead holds the index of a tbl8 group
+# that resolves the last 8 bits of the address.
+EXTENDED = 0x80000000
+GROUP_MASK = 0x7FFFFFFF
+NO_ROUTE = -1
+
+
+class Dir24_8:
+    """
+    A DIR-24-8 lookup table for vectorized IPv4 longest prefix matching.
+
+    tbl24 has one entry per /24, so prefixes of length 24 or less resolve
+    with a single array index. Each /24 covered by a longer prefix points
+    at a 256-entry tbl8 group indexed by the last octet. A whole batch of
+    addresses therefore resolves in two gather passes.
+    """
+
+    def __init__(self, prefixes):
+        """
+        Builds the tables from an iterable of (network, prefix_len, value)
+        with integer networks and non-negative integer values.
+        """
+        # Shorter prefixes are written first so longer ones overwrite them
+        prefixes = sorted(prefixes, key=lambda item: item[1])
+
+        # One tbl8 group per /24 that holds a prefix longer than 24 bits
+        groups = {network >> 8 for network, prefix_len, _ in prefixes if prefix_len > 24}
+
+        self.tbl24 = np.zeros(1 << 24, dtype=np.uint32)
+        self.tbl8 = np.zeros(len(groups) << 8, dtype=np.uint32)
+        next_group = 0
+
+        for network, prefix_len, value in prefixes:
+            entry = value + 1
+            if prefix_len <= 24:
+                start = network >> 8
+                self.tbl24[start:start + (1 << (24 - prefix_len))] = entry
+                continue
+
+            index = network >> 8
+            current = int(self.tbl24[index])
+            if current & EXTENDED:
+                base = (current & GROUP_MASK) << 8
+            else:
+                # Seed a new group with the shorter route it replaces
+                base = next_group << 8
+                self.tbl8[base:base + 256] = current
+                self.tbl24[index] = EXTENDED | next_group
+                next_group += 1
+
+            start = base + (network & 0xFF)
+            self.tbl8[start:start + (1 << (32 - prefix_len))] = entry
+
+        self.groups = next_group   # tbl8 groups in use; tbl8 may have spare capacity
+        self.stale_groups = 0      # groups no tbl24 entry points at any more
+
+    def repainted(self, network: int, prefix_len: int, cover, prefixes) -> "Dir24_8":
+        """
+        Returns a copy of the table with the part under network/prefix_len,
+        where prefix_len is at most 24, rewritten after a route inside it
+        changed. `cover` is the value of the longest remaining prefix of at
+        most prefix_len bits that covers it (None for no route) and
+        `prefixes` lists every (network, prefix_len, value) strictly inside it.
+
+        This table is left untouched, so lookups already running on it keep
+        seeing the old routes. tbl24 is copied; tbl8 is shared while it has
+        spare capacity, since new groups only go past the ones this table
+        uses. Repaint only the newest copy. Replaced groups are never
+        reused and only count as stale; rebuild once there are many.
+        """
+        start = network >> 8
+        span = 1 << (24 - prefix_len)
+        new24 = np.full(span, 0 if cover is None else cover + 1, dtype=np.uint32)
+        groups = {}  # tbl24 offset in the range -> contents of its new group
+
+        for key, length, value in sorted(prefixes, key=lambda item: item[1]):
+            entry = value + 1
+            offset = (key >> 8) - start
+            if length <= 24:
+                new24[offset:offset + (1 << (24 - length))] = entry
+                continue
+            group = groups.get(offset)
+            if group is None:
+                # Seed a new group with the shorter route it replaces
+                group = groups[offset] = np.full(256, new24[offset], dtype=np.uint32)
+            first = key & 0xFF
+            group[first:first + (1 << (32 - length))] = entry
+
+        table = Dir24_8.from_tables(self.tbl24.copy(), self.tbl8)
+        table.groups = self.groups
+        if groups:
+            needed = (table.groups + len(groups)) << 8
+            if needed > len(table.tbl8):
+                # Grow by doubling into a new array
+                tbl8 = np.zeros(max(needed, 2 * len(table.tbl8)), dtype=np.uint32)
+                tbl8[:len(table.tbl8)] = table.tbl8
+                table.tbl8 = tbl8
+            for offset, group in groups.items():
+                base = table.groups << 8
+                table.tbl8[base:base + 256] = group
+                new24[offset] = EXTENDED | table.groups
+                table.groups += 1
+
+        old = table.tbl24[start:start + span]
+        table.stale_groups = self.stale_groups + int(np.count_nonzero(old & EXTENDED))
+        table.tbl24[start:start + span] = new24
+        return table
+
+    @classmethod
+    def from_tables(cls, tbl24: np.ndarray, tbl8: np.ndarray) -> "Dir24_8":
+        """
+        Wraps tables that were built elsewhere, e.g. arrays backed by a
+        memory-mapped FIB file, without copying them.
+        """
+        table = cls.__new__(cls)
+        table.tbl24 = tbl24
+        table.tbl8 = tbl8
+        table.groups = len(tbl8) >> 8
+        table.stale_groups = 0
+        return table
+
+    def lookup(self, addresses: np.ndarray) -> np.ndarray:
+        """
+        Resolves a uint32 array of addresses and returns an int32 array of
+        values, with NO_ROUTE where no prefix matches.
+        """
+        entries = self.tbl24[addresses >> 8]
+        extended = (entries & EXTENDED) != 0
+        if extended.any():
+            groups = (entries[extended] & GROUP_MASK).astype(np.intp)
+            entries[extended] = self.tbl8[(groups << 8) | (addresses[extended] & 0xFF)]
+        return entries.astype(np.int32) - 1
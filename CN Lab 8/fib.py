@@ -0,0 +1,203 @@
+import json
+import mmap
+import struct
+import sys
+
+import numpy as np
+
+import ip_utils
+from dir24_8 import Dir24_8, EXTENDED, GROUP_MASK
+
+# File layout (every section starts on an 8-byte boundary):
+#   header    HEADER below
+#   links     JSON list of link names; lookups store indices into it
+#   tbl24     2**24 uint32 entries of the IPv4 DIR-24-8 table
+#   tbl8      tbl8_groups * 256 uint32 entries
+#   nodes6    v6_nodes NODE6 records, the IPv6 Patricia trie with the root first
+# Integers are in the byte order of the machine that wrote the file, so
+# the tables can be used straight from the mapped pages.
+MAGIC = b"LPMF"
+FORMAT_VERSION = 1
+BYTE_ORDERS = {"little": 1, "big": 2}
+
+# magic, format version, byte order, links bytes, tbl8 groups, IPv6 nodes
+HEADER = struct.Struct("=4sBB2xIII4x")
+# key (16 bytes, big-endian), prefix length, link index (-1 = none), children (0 = none)
+NODE6 = struct.Struct("=16sB3xiII")
+TBL24_ENTRIES = 1 << 24
+
+
+def _padding(size: int) -> int:
+    """Returns the bytes needed to round `size` up to a multiple of 8."""
+    return -size % 8
+
+
+def _flatten_trie6(trie, link_index: dict) -> list:
+    """
+    Numbers the nodes of an IPv6 trie in breadth-first order, root first,
+    and returns their packed NODE6 records.
+    """
+    nodes = [trie.root]
+    numbers = {id(trie.root): 0}
+    position = 0
+    while position < len(nodes):
+        for child in nodes[position].children:
+            if child is not None:
+                numbers[id(child)] = len(nodes)
+                nodes.append(child)
+        position += 1
+
+    records = []
+    for node in nodes:
+        left, right = node.children
+        records.append(NODE6.pack(
+            node.key.to_bytes(16, "big"),
+            node.length,
+            link_index[node.link] if node.link is not None else -1,
+            numbers[id(left)] if left is not None else 0,
+            numbers[id(right)] if right is not None else 0,
+        ))
+    return records
+
+
+def write_fib(router, path: str):
+    """
+    Compiles the router's current IPv4 and IPv6 tables into a FIB file
+    that load_fib can map. Link names must be JSON-serializable.
+    """
+    link_index = {link: index for index, link in enumerate(router.links)}
+    table = router.snapshot(4)
+    dir_table = Dir24_8(
+        (network, prefix_len, link_index[link])
+        for network, prefix_len, link in table.items()
+    )
+    nodes6 = _flatten_trie6(router.snapshot(6), link_index)
+    links = json.dumps(router.links).encode("utf-8")
+    groups = len(dir_table.tbl8) >> 8
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDERS[sys.byteorder],
+                            len(links), groups, len(nodes6)))
+        f.write(links + bytes(_padding(len(links))))
+        f.write(dir_table.tbl24.tobytes())
+        f.write(dir_table.tbl8.tobytes())
+        f.write(b"".join(nodes6))
+
+
+class MappedFib:
+    """
+    A read-only forwarding table served straight from a memory-mapped
+    FIB file. Opening one only parses the header and the link names, and
+    processes mapping the same file share its pages.
+
+    Offers the same route_packet/route_batch API as Router.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buf = buf = memoryview(self._mmap)
+
+        magic, version, byte_order, links_size, groups, nodes6 = HEADER.unpack_from(buf)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Not a version {FORMAT_VERSION} FIB file: {path}")
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            raise ValueError(f"FIB file was written on a machine with another byte order: {path}")
+
+        offset = HEADER.size
+        self.links = json.loads(bytes(buf[offset:offset + links_size]).decode("utf-8"))
+        offset += links_size + _padding(links_size)
+
+        self._tbl24_offset = offset
+        self._tbl8_offset = offset + 4 * TBL24_ENTRIES
+        self._groups = groups
+        self.tbl24 = buf[offset:self._tbl8_offset].cast("I")
+        offset = self._tbl8_offset + 4 * (groups << 8)
+        self.tbl8 = buf[self._tbl8_offset:offset].cast("I")
+        self._nodes6 = buf[offset:offset + NODE6.size * nodes6]
+        self._batch_table = None
+
+    def _lookup6(self, dest: int) -> int:
+        """
+        Walks the mapped IPv6 trie and returns the best link index, or -1.
+        """
+        nodes = self._nodes6
+        if not nodes:
+            return -1
+        best = -1
+        index = 0
+        while True:
+            key, length, link, left, right = NODE6.unpack_from(nodes, index * NODE6.size)
+            # Stop as soon as the compressed path diverges from the key
+            if (dest ^ int.from_bytes(key, "big")) >> (128 - length):
+                break
+            if link >= 0:
+                best = link
+            if length == 128:
+                break
+            index = right if (dest >> (127 - length)) & 1 else left
+            if index == 0:
+                break
+        return best
+
+    def route_packet(self, dest_ip) -> str:
+        """
+        Finds the output link for an IPv4 or IPv6 destination, accepting
+        the same address forms as Router.route_packet.
+        """
+        if ip_utils.ip_version(dest_ip) == 6:
+            index = self._lookup6(ip_utils.parse_address6(dest_ip))
+        else:
+            dest = ip_utils.parse_address(dest_ip)
+            entry = self.tbl24[dest >> 8]
+            if entry & EXTENDED:
+                entry = self.tbl8[((entry & GROUP_MASK) << 8) | (dest & 0xFF)]
+            index = entry - 1
+
+        if index < 0:
+            return "Default Gateway"
+        return self.links[index]
+
+    def route_batch(self, addresses):
+        """
+        Routes a batch of IPv4 destinations like Router.route_batch, with
+        NumPy arrays that view the mapped file instead of copying it.
+        """
+        if self._batch_table is None:
+            tbl24 = np.frombuffer(self._mmap, dtype=np.uint32, count=TBL24_ENTRIES,
+                                  offset=self._tbl24_offset)
+            tbl8 = np.frombuffer(self._mmap, dtype=np.uint32, count=self._groups << 8,
+                                 offset=self._tbl8_offset)
+            self._batch_table = Dir24_8.from_tables(tbl24, tbl8)
+
+        if isinstance(addresses, np.ndarray):
+            addresses = addresses.astype(np.uint32, copy=False)
+        else:
+            addresses = np.fromiter(
+                (ip_utils.parse_address(ip) for ip in addresses), dtype=np.uint32
+            )
+        return self._batch_table.lookup(addresses)
+
+    def close(self):
+        """
+        Releases the views and unmaps the file.
+        """
+        self._batch_table = None
+        self.tbl24.release()
+        self.tbl8.release()
+        self._nodes6.release()
+        self._buf.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_fib(path: str) -> MappedFib:
+    """
+    Maps a FIB file written by write_fib.
+    """
+    return MappedFib(path)
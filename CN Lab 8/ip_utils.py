@@ -1,3 +1,6 @@
+import socket
+
+
 def ip_to_binary(ip_address: str) -> str:
     """
     Converts a dotted-decimal IP address string to a 32-bit binary string.
@@ -22,3 +25,136 @@ def get_network_prefix(ip_cidr: str) -> str:
     
     # Return only the network prefix part of the binary string
     return binary_ip[:prefix_len]
+
+
+# --- Integer representation ---
+# The functions below work on addresses as plain 32-bit integers so the
+# routing hot path never has to build a binary string per packet.
+
+def ip_to_int(ip_address: str) -> int:
+    """
+    Converts a dotted-decimal IP address string to a 32-bit integer.
+    Raises ValueError if the string is not a valid IPv4 address.
+    """
+    try:
+        packed = socket.inet_pton(socket.AF_INET, ip_address)
+    except (OSError, TypeError):
+        raise ValueError(f"Invalid IPv4 address: {ip_address!r}") from None
+    return int.from_bytes(packed, "big")
+
+def int_to_ip(value: int) -> str:
+    """
+    Converts a 32-bit integer back to a dotted-decimal IP address string.
+    """
+    return socket.inet_ntop(socket.AF_INET, value.to_bytes(4, "big"))
+
+def parse_address(address) -> int:
+    """
+    Validates a destination address and returns it as a 32-bit integer.
+    Accepts a dotted-decimal string, 4 already-packed bytes (network
+    byte order, e.g. straight from a packet header) or an integer.
+    """
+    if isinstance(address, int):
+        if not 0 <= address <= 0xFFFFFFFF:
+            raise ValueError(f"IPv4 address out of range: {address}")
+        return address
+    if isinstance(address, (bytes, bytearray, memoryview)):
+        if len(address) != 4:
+            raise ValueError(f"Packed IPv4 address must be 4 bytes, got {len(address)}")
+        return int.from_bytes(address, "big")
+    return ip_to_int(address)
+
+def prefix_mask(prefix_len: int) -> int:
+    """
+    Returns the 32-bit netmask with the top `prefix_len` bits set.
+    """
+    if not 0 <= prefix_len <= 32:
+        raise ValueError(f"Invalid prefix length: {prefix_len}")
+    return (0xFFFFFFFF << (32 - prefix_len)) & 0xFFFFFFFF
+
+def parse_cidr(ip_cidr: str) -> tuple:
+    """
+    Takes a CIDR string and returns (network, mask, prefix_len) with
+    the network and mask as 32-bit integers. Host bits are cleared.
+    """
+    ip, sep, prefix_len_str = ip_cidr.partition('/')
+    if not sep or not prefix_len_str.isdigit():
+        raise ValueError(f"Invalid CIDR: {ip_cidr!r}")
+    prefix_len = int(prefix_len_str)
+    mask = prefix_mask(prefix_len)
+    return ip_to_int(ip) & mask, mask, prefix_len
+
+def in_network(address: int, network: int, mask: int) -> bool:
+    """
+    Checks whether an integer address falls inside network/mask.
+    """
+    return address & mask == network
+
+
+# --- IPv6 ---
+# Same integer representation with 128-bit values. socket.inet_pton
+# handles '::' compression and embedded IPv4 tails.
+
+def ipv6_to_int(ip_address: str) -> int:
+    """
+    Converts an IPv6 address string (with or without '::') to a 128-bit integer.
+    Raises ValueError if the string is not a valid IPv6 address.
+    """
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip_address)
+    except (OSError, TypeError):
+        raise ValueError(f"Invalid IPv6 address: {ip_address!r}") from None
+    return int.from_bytes(packed, "big")
+
+def int_to_ipv6(value: int) -> str:
+    """
+    Converts a 128-bit integer to its compressed IPv6 string form.
+    """
+    return socket.inet_ntop(socket.AF_INET6, value.to_bytes(16, "big"))
+
+def parse_address6(address) -> int:
+    """
+    Validates an IPv6 destination and returns it as a 128-bit integer.
+    Accepts an IPv6 string, 16 already-packed bytes or an integer.
+    """
+    if isinstance(address, int):
+        if not 0 <= address < (1 << 128):
+            raise ValueError(f"IPv6 address out of range: {address}")
+        return address
+    if isinstance(address, (bytes, bytearray, memoryview)):
+        if len(address) != 16:
+            raise ValueError(f"Packed IPv6 address must be 16 bytes, got {len(address)}")
+        return int.from_bytes(address, "big")
+    return ipv6_to_int(address)
+
+def prefix_mask6(prefix_len: int) -> int:
+    """
+    Returns the 128-bit netmask with the top `prefix_len` bits set.
+    """
+    if not 0 <= prefix_len <= 128:
+        raise ValueError(f"Invalid IPv6 prefix length: {prefix_len}")
+    return ((1 << prefix_len) - 1) << (128 - prefix_len)
+
+def parse_cidr6(ip_cidr: str) -> tuple:
+    """
+    Takes an IPv6 CIDR string and returns (network, mask, prefix_len)
+    as 128-bit integers. Host bits are cleared.
+    """
+    ip, sep, prefix_len_str = ip_cidr.partition('/')
+    if not sep or not prefix_len_str.isdigit():
+        raise ValueError(f"Invalid CIDR: {ip_cidr!r}")
+    prefix_len = int(prefix_len_str)
+    mask = prefix_mask6(prefix_len)
+    return ipv6_to_int(ip) & mask, mask, prefix_len
+
+def ip_version(address) -> int:
+    """
+    Returns 4 or 6 for an address or CIDR string, packed bytes or integer.
+    Integers that fit in 32 bits count as IPv4; pass low IPv6 addresses
+    such as '::1' as strings or packed bytes instead.
+    """
+    if isinstance(address, str):
+        return 6 if ':' in address else 4
+    if isinstance(address, int):
+        return 4 if address <= 0xFFFFFFFF else 6
+    return 6 if len(address) == 16 else 4
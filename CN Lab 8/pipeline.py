@@ -0,0 +1,237 @@
+import argparse
+import random
+import time
+from array import array
+
+from router import Router
+from scheduler import DrrScheduler, FifoScheduler, Packet, PriorityScheduler, WfqScheduler, payload_size
+
+
+class OutputPort:
+    """
+    One output link of the forwarding element: a scheduler holding at most
+    `buffer_size` waiting packets in front of a link of `rate` bits/s.
+    """
+    __slots__ = (
+        "name", "rate", "buffer_size", "scheduler", "busy_until", "arrivals",
+        "dropped", "bytes_sent", "first_arrival", "last_departure",
+        "depth_sum", "depth_samples", "max_depth", "latencies",
+    )
+
+    def __init__(self, name, rate: float, buffer_size: int, scheduler):
+        self.name = name
+        self.rate = rate
+        self.buffer_size = buffer_size
+        self.scheduler = scheduler
+        self.busy_until = 0.0       # when the packet on the wire finishes
+        self.arrivals = {}          # id(packet) -> arrival time, while queued
+        self.dropped = 0
+        self.bytes_sent = 0
+        self.first_arrival = None
+        self.last_departure = 0.0
+        self.depth_sum = 0
+        self.depth_samples = 0
+        self.max_depth = 0
+        self.latencies = array("d")
+
+    def drain(self, now: float):
+        """
+        Sends queued packets whose transmission starts by `now`.
+        """
+        scheduler = self.scheduler
+        arrivals = self.arrivals
+        latencies = self.latencies
+        busy_until = self.busy_until
+        while busy_until <= now and len(scheduler):
+            packet = scheduler.dequeue()
+            size = payload_size(packet)
+            busy_until += size * 8 / self.rate
+            latencies.append(busy_until - arrivals.pop(id(packet)))
+            self.bytes_sent += size
+        self.busy_until = busy_until
+        self.last_departure = max(self.last_departure, busy_until)
+
+    def arrive(self, now: float, packet: Packet):
+        """
+        Accepts a packet arriving at `now`: it is sent at once if the link
+        is idle, queued if there is buffer space, and dropped otherwise.
+        """
+        if self.first_arrival is None:
+            self.first_arrival = now
+        self.drain(now)
+
+        depth = len(self.scheduler)
+        self.depth_sum += depth
+        self.depth_samples += 1
+
+        if depth == 0 and self.busy_until <= now:
+            size = payload_size(packet)
+            self.busy_until = now + size * 8 / self.rate
+            self.latencies.append(self.busy_until - now)
+            self.bytes_sent += size
+            self.last_departure = self.busy_until
+        elif depth >= self.buffer_size:
+            self.dropped += 1
+        else:
+            self.arrivals[id(packet)] = now
+            self.scheduler.enqueue(packet)
+            if depth + 1 > self.max_depth:
+                self.max_depth = depth + 1
+
+    def summary(self) -> dict:
+        """
+        Returns throughput, queue depth, drop and latency figures for the port.
+        """
+        duration = self.last_departure - (self.first_arrival or 0.0)
+        result = {
+            "forwarded": len(self.latencies),
+            "dropped": self.dropped,
+            "bytes": self.bytes_sent,
+            "throughput_bps": self.bytes_sent * 8 / duration if duration > 0 else 0.0,
+            "mean_queue": self.depth_sum / self.depth_samples if self.depth_samples else 0.0,
+            "max_queue": self.max_depth,
+        }
+        result.update(latency_percentiles(self.latencies))
+        return result
+
+
+def latency_percentiles(latencies: array) -> dict:
+    """
+    Returns the p50/p90/p99/max of a latency array, in seconds.
+    """
+    if not latencies:
+        return {"latency_p50": 0.0, "latency_p90": 0.0, "latency_p99": 0.0, "latency_max": 0.0}
+    import numpy as np
+
+    values = np.frombuffer(latencies, dtype=np.float64)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        "latency_p50": float(p50),
+        "latency_p90": float(p90),
+        "latency_p99": float(p99),
+        "latency_max": float(values.max()),
+    }
+
+
+class ForwardingPipeline:
+    """
+    Discrete-event model of a forwarding element: every arriving packet is
+    classified by `router.route_packet`, queued at the output port for its
+    link and drained by that port's scheduler at the port's link rate.
+
+    Output ports never interact, so instead of a global event heap each
+    port advances its own clock to the time of the next arrival it sees.
+    That keeps the cost per packet O(1) plus the scheduler's own cost.
+    """
+
+    def __init__(self, router: Router, link_rate: float = 1e9, buffer_size: int = 1000,
+                 scheduler=FifoScheduler, port_rates: dict = None):
+        """
+        `link_rate` (bits/s) and `buffer_size` (waiting packets) apply to
+        every port unless `port_rates` gives a link its own rate.
+        `scheduler` is a class or factory returning a new scheduler.
+        """
+        self.router = router
+        self.link_rate = link_rate
+        self.buffer_size = buffer_size
+        self.scheduler = scheduler
+        self.port_rates = port_rates or {}
+        self.ports = {}
+
+    def _port(self, link) -> OutputPort:
+        port = self.ports.get(link)
+        if port is None:
+            rate = self.port_rates.get(link, self.link_rate)
+            port = self.ports[link] = OutputPort(link, rate, self.buffer_size, self.scheduler())
+        return port
+
+    def run(self, arrivals) -> dict:
+        """
+        Pushes (arrival time, Packet) pairs, in time order, through the
+        pipeline and returns a summary per port. Packets must be distinct
+        objects while they are queued.
+        """
+        route = self.router.route_packet
+        ports = self.ports
+        get_port = self._port
+
+        for now, packet in arrivals:
+            link = route(packet.dest_ip)
+            port = ports.get(link) or get_port(link)
+            port.arrive(now, packet)
+
+        for port in ports.values():
+            port.drain(float("inf"))
+        return {link: port.summary() for link, port in ports.items()}
+
+
+def synthetic_arrivals(count: int, destinations: list, load: float, link_rate: float,
+                       ports: int, seed: int = 5):
+    """
+    Yields `count` (time, Packet) pairs with Poisson arrivals at `load`
+    times the combined capacity of `ports` links of `link_rate` bits/s.
+    Payloads are shared bytes objects so memory stays flat.
+    """
+    rng = random.Random(seed)
+    sizes = [64, 576, 1500]
+    payloads = {size: bytes(size) for size in sizes}
+    mean_bits = 8 * sum(sizes) / len(sizes)
+    rate = load * ports * link_rate / mean_bits  # packets per second
+    now = 0.0
+    for _ in range(count):
+        now += rng.expovariate(rate)
+        yield now, Packet("10.0.0.1", rng.choice(destinations), payloads[rng.choice(sizes)],
+                          rng.randrange(3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forwarding pipeline simulator")
+    parser.add_argument("--packets", type=int, default=1_000_000, help="Packets to simulate")
+    parser.add_argument("--load", type=float, default=0.9, help="Offered load relative to total link capacity")
+    parser.add_argument("--rate", type=float, default=1e9, help="Link rate in bits/s")
+    parser.add_argument("--buffer", type=int, default=256, help="Buffer size per port, in packets")
+    parser.add_argument("--scheduler", choices=["fifo", "priority", "drr", "wfq"], default="fifo")
+    parser.add_argument("--weights", default="",
+                        help="Comma-separated PRIORITY=WEIGHT shares for drr/wfq, e.g. 0=4,1=2,2=1 (default 1 each)")
+    args = parser.parse_args()
+
+    try:
+        weights = {}
+        for item in filter(None, args.weights.split(",")):
+            cls, _, weight = item.partition("=")
+            if not weight:
+                raise ValueError(f"expected PRIORITY=WEIGHT, got {item!r}")
+            weights[int(cls)] = float(weight)
+        # Make one now so a bad weight is reported before the run
+        schedulers = {
+            "fifo": FifoScheduler,
+            "priority": PriorityScheduler,
+            "drr": lambda: DrrScheduler(weights),
+            "wfq": lambda: WfqScheduler(weights),
+        }
+        schedulers[args.scheduler]()
+    except ValueError as e:
+        parser.error(f"--weights: {e}")
+
+    routes = [
+        ("223.1.1.0/24", "Link 0"),
+        ("223.1.2.0/24", "Link 1"),
+        ("223.1.3.0/24", "Link 2"),
+        ("223.1.0.0/16", "Link 4 (ISP)"),
+    ]
+    destinations = ["223.1.1.100", "223.1.2.5", "223.1.3.9", "223.1.250.1"]
+    router = Router(routes, cache_size=1024)
+    pipeline = ForwardingPipeline(
+        router, link_rate=args.rate, buffer_size=args.buffer,
+        scheduler=schedulers[args.scheduler],
+    )
+
+    start = time.perf_counter()
+    report = pipeline.run(synthetic_arrivals(args.packets, destinations, args.load, args.rate, len(routes)))
+    elapsed = time.perf_counter() - start
+
+    print(f"Simulated {args.packets:,} packets in {elapsed:.1f} s ({args.packets / elapsed:,.0f} packets/s)")
+    for link, stats in report.items():
+        print(f"\n{link}")
+        for key, value in stats.items():
+            print(f"  {key:>15}: {value:,.6g}" if isinstance(value, float) else f"  {key:>15}: {value:,}")
@@ -0,0 +1,108 @@
+import threading
+
+
+class RouteCache:
+    """
+    A bounded destination -> link cache with CLOCK replacement.
+
+    Hits only read a dict and set a reference bit, so they never take the
+    lock; inserts, evictions and invalidations do. Every entry is tagged
+    with the forwarding table version it was computed from, and results
+    from an older version than the cache has seen are refused, so a slow
+    reader can never put back an entry an update just invalidated.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError(f"Cache capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        # address -> (slot, link); a single dict read gives a consistent pair
+        self._entries = {}
+        self._keys = [None] * capacity
+        self._referenced = bytearray(capacity)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._hand = 0
+        self._lock = threading.Lock()
+        self.version = 0
+
+        # Counters for sizing the cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, address: int):
+        """
+        Returns the cached link for `address`, or None on a miss.
+        """
+        entry = self._entries.get(address)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._referenced[entry[0]] = 1
+        return entry[1]
+
+    def put(self, address: int, link, version: int):
+        """
+        Caches `link` for `address` as computed from table `version`.
+        Evicts the first unreferenced entry under the clock hand when full.
+        """
+        with self._lock:
+            if version != self.version or address in self._entries:
+                return
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = self._evict()
+            self._keys[slot] = address
+            self._referenced[slot] = 0
+            self._entries[address] = (slot, link)
+
+    def _evict(self) -> int:
+        """
+        Advances the clock hand past referenced entries, clearing their
+        bits, and frees the first unreferenced one. Returns its slot.
+        """
+        while True:
+            slot = self._hand
+            self._hand = (slot + 1) % self.capacity
+            if self._referenced[slot]:
+                self._referenced[slot] = 0
+                continue
+            del self._entries[self._keys[slot]]
+            self._keys[slot] = None
+            self.evictions += 1
+            return slot
+
+    def invalidate(self, network: int, mask: int, version: int):
+        """
+        Drops every cached address covered by network/mask and moves the
+        cache to table `version`. Addresses outside the prefix are kept.
+        """
+        with self._lock:
+            self.version = version
+            stale = [address for address in self._entries if address & mask == network]
+            for address in stale:
+                slot = self._entries.pop(address)[0]
+                self._keys[slot] = None
+                self._free.append(slot)
+            self.invalidations += len(stale)
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters along with its current size.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def __len__(self):
+        return len(self._entries)
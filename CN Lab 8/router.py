@@ -1,49 +1,201 @@
+import threading
+
 # We must import the functions from Part 1
 import ip_utils
+from route_cache import RouteCache
+from trie import PatriciaTrie
 
 class Router:
     """
     Implements a router with a forwarding table based on longest prefix matching.
     """
     
-    def __init__(self, routes):
+    def __init__(self, routes, cache_size: int = 0):
         """
-        Initializes the router with a list of routes.
+        Initializes the router with a list of IPv4 and/or IPv6 routes.
+        A positive `cache_size` puts a CLOCK route cache of that many
+        destinations (per address family) in front of route_packet.
         """
-        self.forwarding_table = []
+        # Distinct output links; route_batch returns indices into this list
+        self.links = []
+        self._link_index = {}
+        # (trie, DIR-24-8 tables) for route_batch; route updates publish a
+        # repainted copy, and the tables are only rebuilt once mostly stale
+        self._batch_table = None
+        # Serializes writers only; readers never take it
+        self._update_lock = threading.Lock()
+        self.cache = RouteCache(cache_size) if cache_size > 0 else None
+        self.cache6 = RouteCache(cache_size) if cache_size > 0 else None
+        self.forwarding_table = PatriciaTrie(32)
+        self.forwarding_table6 = PatriciaTrie(128)
         self._build_forwarding_table(routes)
 
+    def _register_link(self, link):
+        """
+        Gives `link` a stable index in `self.links` if it has none yet.
+        """
+        if link not in self._link_index:
+            self._link_index[link] = len(self.links)
+            self.links.append(link)
+
+    def _parse_route(self, cidr: str) -> tuple:
+        """
+        Returns (ip_version, network, mask, prefix_len) for an IPv4 or IPv6 CIDR.
+        """
+        if ip_utils.ip_version(cidr) == 6:
+            return (6,) + ip_utils.parse_cidr6(cidr)
+        return (4,) + ip_utils.parse_cidr(cidr)
+
     def _build_forwarding_table(self, routes):
         """
-        Converts human-readable routes into an optimized internal table
-        storing binary prefixes.
+        Converts human-readable routes into one Patricia trie per address
+        family, keyed on the integer value of each network prefix.
         """
+        prefixes = {4: [], 6: []}
         for cidr, link in routes:
-            # Get the binary prefix for each CIDR
-            prefix = ip_utils.get_network_prefix(cidr)
-            self.forwarding_table.append((prefix, link))
-        
-        # Sort the table by prefix length, from longest to shortest.
-        # This is the crucial step for the algorithm.
-        self.forwarding_table.sort(key=lambda item: len(item[0]), reverse=True)
+            # Get the integer network and prefix length for each CIDR
+            version, network, _, prefix_len = self._parse_route(cidr)
+            prefixes[version].append((network, prefix_len, link))
+            self._register_link(link)
+        self.forwarding_table = PatriciaTrie.from_prefixes(prefixes[4], 32)
+        self.forwarding_table6 = PatriciaTrie.from_prefixes(prefixes[6], 128)
+
+    def snapshot(self, ip_version: int = 4) -> PatriciaTrie:
+        """
+        Returns the current forwarding table for IPv4 or IPv6. It is never
+        modified, so it can be read for as long as needed; its `version`
+        tells updates apart.
+        """
+        return self.forwarding_table6 if ip_version == 6 else self.forwarding_table
+
+    def _publish(self, ip_version: int, table: PatriciaTrie, network: int, mask: int, prefix_len: int):
+        """
+        Makes `table` the live forwarding table for its family and drops
+        the cached destinations covered by the prefix that changed.
+        """
+        # Publishing the new trie is a single reference assignment
+        if ip_version == 6:
+            self.forwarding_table6 = table
+            cache = self.cache6
+        else:
+            batch_table = self._patch_batch_table(self.forwarding_table, table, network, prefix_len)
+            self.forwarding_table = table
+            self._batch_table = batch_table
+            cache = self.cache
+        if cache is not None:
+            cache.invalidate(network, mask, table.version)
+
+    def _patch_batch_table(self, old: PatriciaTrie, table: PatriciaTrie, network: int, prefix_len: int):
+        """
+        Returns route_batch's (trie, DIR-24-8 tables) pair for `table`,
+        made from the one for `old` by repainting only the /24s under the
+        changed prefix in a copy, so a batch in flight finishes on the old
+        tables. Returns None once more than half of the tbl8 groups are
+        stale, and the next route_batch rebuilds the tables.
+        """
+        cached = self._batch_table
+        if cached is None:
+            return None
+        dir_table = cached[1]
+        if cached[0] is not old or dir_table.stale_groups > max(1024, dir_table.groups // 2):
+            return None
 
-    def route_packet(self, dest_ip: str) -> str:
+        # A prefix longer than 24 bits lives in its /24's tbl8 group
+        length = min(prefix_len, 24)
+        network &= ip_utils.prefix_mask(length)
+        cover = table.match(network, length)
+        inner = [(key, key_len, self._link_index[link])
+                 for key, key_len, link in table.items(network, length) if key_len > length]
+        return table, dir_table.repainted(
+            network, length, None if cover is None else self._link_index[cover], inner)
+
+    def add_route(self, cidr: str, link):
+        """
+        Adds a route, or replaces the link of an existing prefix.
+        Costs O(prefix length), plus copying route_batch's tbl24 and
+        repainting the /24s it covers once those tables exist; concurrent
+        lookups and batches see either the old table or the new one, never
+        a partial update.
+        """
+        version, network, mask, prefix_len = self._parse_route(cidr)
+        with self._update_lock:
+            self._register_link(link)
+            table = self.snapshot(version).insert(network, prefix_len, link)
+            self._publish(version, table, network, mask, prefix_len)
+
+    def withdraw_route(self, cidr: str):
+        """
+        Removes a route and returns the link it pointed to.
+        Raises KeyError if the prefix is not in the forwarding table.
+        """
+        version, network, mask, prefix_len = self._parse_route(cidr)
+        with self._update_lock:
+            table = self.snapshot(version)
+            link = table.get(network, prefix_len)
+            if link is None:
+                raise KeyError(cidr)
+            self._publish(version, table.remove(network, prefix_len), network, mask, prefix_len)
+        return link
+
+    def route_packet(self, dest_ip) -> str:
         """
         Finds the correct output link for a destination IP using
-        the longest prefix matching algorithm.
-        """
-        # Convert the destination IP to its 32-bit binary form
-        binary_dest_ip = ip_utils.ip_to_binary(dest_ip)
-        
-        # Iterate through the sorted table
-        for prefix, link in self.forwarding_table:
-            # Check if the destination IP starts with the prefix
-            if binary_dest_ip.startswith(prefix):
-                # The first match is the longest match
+        the longest prefix matching algorithm. The destination may be a
+        dotted-decimal or IPv6 string, 4 or 16 packed bytes or an integer
+        (see ip_utils.ip_version for how integers are classified).
+        """
+        # Convert the destination IP to its 32- or 128-bit integer form
+        if ip_utils.ip_version(dest_ip) == 6:
+            dest = ip_utils.parse_address6(dest_ip)
+            table, cache = self.forwarding_table6, self.cache6
+        else:
+            dest = ip_utils.parse_address(dest_ip)
+            table, cache = self.forwarding_table, self.cache
+
+        if cache is not None:
+            link = cache.get(dest)
+            if link is not None:
                 return link
-        
-        # If no match is found, return the default route
-        return "Default Gateway"
+
+        # Walk the trie; the deepest labelled node on the path is the longest match
+        link = table.lookup(dest)
+        if link is None:
+            # If no match is found, use the default route
+            link = "Default Gateway"
+
+        if cache is not None:
+            cache.put(dest, link, table.version)
+        return link
+
+    def route_batch(self, addresses):
+        """
+        Routes a whole batch of destinations at once. Accepts a NumPy
+        uint32 array or any iterable of IPv4 addresses route_packet accepts,
+        and returns an int32 array of indices into `self.links`, with -1
+        for packets that go to the default gateway.
+        """
+        import numpy as np
+        from dir24_8 import Dir24_8
+
+        if isinstance(addresses, np.ndarray):
+            addresses = addresses.astype(np.uint32, copy=False)
+        else:
+            addresses = np.fromiter(
+                (ip_utils.parse_address(ip) for ip in addresses), dtype=np.uint32
+            )
+
+        # Resolve the whole batch against one snapshot of the table
+        table = self.snapshot()
+        cached = self._batch_table
+        if cached is None or cached[0] is not table:
+            cached = (table, Dir24_8(
+                (network, prefix_len, self._link_index[link])
+                for network, prefix_len, link in table.items()
+            ))
+            # A table an update already replaced would only be thrown away
+            if table is self.forwarding_table:
+                self._batch_table = cached
+        return cached[1].lookup(addresses)
 
 
 # --- Test Case ---
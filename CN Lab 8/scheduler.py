@@ -1,7 +1,14 @@
+import heapq
+from collections import deque
+
+
 class Packet:
     """
     A simple class to store packet attributes.
+    __slots__ drops the per-instance dict, which keeps large queues small.
     """
+    __slots__ = ("source_ip", "dest_ip", "payload", "priority")
+
     def __init__(self, source_ip: str, dest_ip: str, payload: str, priority: int):
         self.source_ip = source_ip
         self.dest_ip = dest_ip
@@ -30,6 +37,212 @@ def priority_scheduler(packet_list: list) -> list:
     return sorted(packet_list, key=lambda packet: packet.priority)
 
 
+class FifoScheduler:
+    """
+    Online FIFO scheduler: packets leave in the order they arrived.
+    """
+    def __init__(self):
+        self._queue = deque()
+
+    def enqueue(self, packet: Packet):
+        self._queue.append(packet)
+
+    def dequeue(self) -> Packet:
+        """
+        Removes and returns the next packet. Raises IndexError when empty.
+        """
+        if not self._queue:
+            raise IndexError("dequeue from an empty scheduler")
+        return self._queue.popleft()
+
+    def __len__(self):
+        return len(self._queue)
+
+
+class PriorityScheduler:
+    """
+    Online priority scheduler for a live queue.
+    Keeps one FIFO deque per priority level plus a min-heap of the levels
+    that currently hold packets, so enqueue and dequeue cost O(log levels)
+    and packets of equal priority keep their arrival order.
+    """
+    def __init__(self):
+        self._queues = {}
+        self._active = []  # heap of priorities with a non-empty queue
+        self._size = 0
+
+    def enqueue(self, packet: Packet):
+        queue = self._queues.get(packet.priority)
+        if queue is None:
+            queue = self._queues[packet.priority] = deque()
+        if not queue:
+            heapq.heappush(self._active, packet.priority)
+        queue.append(packet)
+        self._size += 1
+
+    def dequeue(self) -> Packet:
+        """
+        Removes and returns the oldest packet of the highest priority
+        (lowest number). Raises IndexError when empty.
+        """
+        if not self._active:
+            raise IndexError("dequeue from an empty scheduler")
+        queue = self._queues[self._active[0]]
+        packet = queue.popleft()
+        if not queue:
+            heapq.heappop(self._active)
+        self._size -= 1
+        return packet
+
+    def __len__(self):
+        return self._size
+
+
+def payload_size(packet: Packet) -> int:
+    """
+    Returns the packet's payload size in bytes (UTF-8 for text payloads).
+    """
+    payload = packet.payload
+    if isinstance(payload, str):
+        return len(payload.encode("utf-8"))
+    return len(payload)
+
+
+def _check_weights(weights: dict) -> dict:
+    """
+    Returns the weights, or {} for None. Raises ValueError on a weight that
+    is not positive: that class would never get any share.
+    """
+    weights = weights or {}
+    for cls, weight in weights.items():
+        if not weight > 0:
+            raise ValueError(f"Weight of class {cls} must be positive, got {weight}")
+    return weights
+
+
+class DrrScheduler:
+    """
+    Deficit Round Robin scheduler.
+    Each class (the packet's priority value) gets `quantum * weight` bytes
+    of credit per round and sends head-of-line packets while its credit
+    covers them, so every backlogged class gets a byte share proportional
+    to its weight and none is starved. O(1) per packet.
+    """
+    def __init__(self, weights: dict = None, quantum: int = 1500):
+        if quantum <= 0:
+            raise ValueError(f"Quantum must be positive, got {quantum}")
+        self.weights = _check_weights(weights)
+        self.quantum = quantum
+        self._queues = {}   # class -> deque of (size, packet)
+        self._deficit = {}
+        self._active = deque()  # round-robin order of backlogged classes
+        self._size = 0
+
+    def _start_turn(self, cls):
+        self._deficit[cls] += self.quantum * self.weights.get(cls, 1)
+
+    def enqueue(self, packet: Packet):
+        cls = packet.priority
+        queue = self._queues.get(cls)
+        if queue is None:
+            queue = self._queues[cls] = deque()
+            self._deficit[cls] = 0
+        if not queue:
+            self._active.append(cls)
+            if len(self._active) == 1:
+                self._start_turn(cls)
+        queue.append((payload_size(packet), packet))
+        self._size += 1
+
+    def dequeue(self) -> Packet:
+        """
+        Removes and returns the next packet in DRR order.
+        Raises IndexError when empty.
+        """
+        if not self._active:
+            raise IndexError("dequeue from an empty scheduler")
+        active = self._active
+        while True:
+            cls = active[0]
+            queue = self._queues[cls]
+            size, packet = queue[0]
+            if size <= self._deficit[cls]:
+                queue.popleft()
+                self._size -= 1
+                self._deficit[cls] -= size
+                if not queue:
+                    # An idle class keeps no credit
+                    self._deficit[cls] = 0
+                    active.popleft()
+                    if active:
+                        self._start_turn(active[0])
+                return packet
+            # Out of credit: the next class takes its turn
+            active.rotate(-1)
+            self._start_turn(active[0])
+
+    def __len__(self):
+        return self._size
+
+
+class WfqScheduler:
+    """
+    Weighted Fair Queuing, using self-clocked finish tags.
+    Each packet gets the tag max(virtual time, previous tag of its class)
+    + size / weight, and packets leave in tag order; the virtual time is
+    the tag of the packet last sent. O(log n) per packet.
+    """
+    def __init__(self, weights: dict = None):
+        self.weights = _check_weights(weights)
+        self._heap = []  # (finish tag, arrival number, packet)
+        self._last_finish = {}
+        self._virtual_time = 0.0
+        self._arrivals = 0
+
+    def enqueue(self, packet: Packet):
+        cls = packet.priority
+        start = max(self._virtual_time, self._last_finish.get(cls, 0.0))
+        finish = start + payload_size(packet) / self.weights.get(cls, 1)
+        self._last_finish[cls] = finish
+        # The arrival number keeps equal tags in FIFO order
+        heapq.heappush(self._heap, (finish, self._arrivals, packet))
+        self._arrivals += 1
+
+    def dequeue(self) -> Packet:
+        """
+        Removes and returns the packet with the smallest finish tag.
+        Raises IndexError when empty.
+        """
+        if not self._heap:
+            raise IndexError("dequeue from an empty scheduler")
+        finish, _, packet = heapq.heappop(self._heap)
+        self._virtual_time = finish
+        return packet
+
+    def __len__(self):
+        return len(self._heap)
+
+
+def drr_scheduler(packet_list: list, weights: dict = None, quantum: int = 1500) -> list:
+    """
+    Simulates a Deficit Round Robin scheduler over packets that are all
+    waiting at once. `weights` maps a priority value to its share.
+    """
+    scheduler = DrrScheduler(weights, quantum)
+    for packet in packet_list:
+        scheduler.enqueue(packet)
+    return [scheduler.dequeue() for _ in range(len(packet_list))]
+
+def wfq_scheduler(packet_list: list, weights: dict = None) -> list:
+    """
+    Simulates a Weighted Fair Queuing scheduler over packets that are all
+    waiting at once. `weights` maps a priority value to its share.
+    """
+    scheduler = WfqScheduler(weights)
+    for packet in packet_list:
+        scheduler.enqueue(packet)
+    return [scheduler.dequeue() for _ in range(len(packet_list))]
+
 # --- Test Case ---
 # This block will run only when scheduler.py is executed directly
 if __name__ == "__main__":
@@ -55,3 +268,12 @@ if __name__ == "__main__":
     # Expected: VOIP 1, VOIP 2, Video 1, Data 1, Data 2
     for p in priority_order:
         print(p.payload)
+
+    # 4. Run the weighted fair schedulers (VOIP weighted 4x the others)
+    weights = {0: 4, 1: 1, 2: 1}
+    print("\n--- DRR Scheduler Output ---")
+    for p in drr_scheduler(packets, weights, quantum=8):
+        print(p.payload)
+    print("\n--- WFQ Scheduler Output ---")
+    for p in wfq_scheduler(packets, weights):
+        print(p.payload)
@@ -0,0 +1,263 @@
+class TrieNode:
+    """
+    A single node of the path-compressed (Patricia) trie.
+
+    `key` holds the prefix bits left-aligned in a `width`-bit integer and
+    `length` is the number of significant bits. `link` is None for the
+    internal branching nodes that only exist to split two prefixes.
+    """
+    __slots__ = ("key", "length", "link", "children")
+
+    def __init__(self, key: int, length: int, link=None, children=None):
+        self.key = key
+        self.length = length
+        self.link = link
+        self.children = children if children is not None else [None, None]
+
+    def copy(self) -> "TrieNode":
+        """Returns a shallow copy that shares both subtrees."""
+        return TrieNode(self.key, self.length, self.link, self.children.copy())
+
+
+class PatriciaTrie:
+    """
+    A path-compressed binary trie for longest prefix matching.
+
+    Chains of single-child nodes are collapsed into one node that carries
+    the whole bit string, so a lookup visits at most one node per branching
+    point on the path. The cost depends on the address width, never on the
+    number of prefixes stored.
+
+    The trie is persistent: insert() and remove() never modify it, they
+    return a new trie with a higher `version` that copies only the nodes on
+    the updated path and shares the rest. Anyone holding a trie can keep
+    reading it without locks while updates are published elsewhere.
+    """
+
+    def __init__(self, width: int = 32, root: TrieNode = None, size: int = 0, version: int = 0):
+        self.width = width
+        self.root = root if root is not None else TrieNode(0, 0)
+        self.size = size
+        self.version = version
+
+    @classmethod
+    def from_prefixes(cls, prefixes, width: int = 32) -> "PatriciaTrie":
+        """
+        Builds a trie from an iterable of (key, length, link). The nodes are
+        not visible to anyone yet, so they are updated in place.
+        """
+        trie = cls(width)
+        for key, length, link in prefixes:
+            if trie._insert(trie.root, key, length, link, copy=False):
+                trie.size += 1
+        return trie
+
+    def _bit(self, key: int, position: int) -> int:
+        """
+        Returns the bit of `key` at `position`, counting from the most
+        significant bit.
+        """
+        return (key >> (self.width - 1 - position)) & 1
+
+    def _mask(self, length: int) -> int:
+        """
+        Returns a `width`-bit mask with the top `length` bits set.
+        """
+        return ((1 << length) - 1) << (self.width - length)
+
+    def _insert(self, node: TrieNode, key: int, length: int, link, copy: bool) -> bool:
+        """
+        Stores `link` for the prefix below `node`, which must be a node the
+        caller owns. With `copy` set every node on the way down is copied
+        before it is changed. Returns True if the prefix is new.
+        """
+        key &= self._mask(length)
+
+        while True:
+            if node.length == length:
+                # Exact prefix already has a node: just (re)label it
+                added = node.link is None
+                node.link = link
+                return added
+
+            bit = self._bit(key, node.length)
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = TrieNode(key, length, link)
+                return True
+
+            # Length of the prefix shared by the new key and the child
+            diff = key ^ child.key
+            common = min(length, child.length, self.width - diff.bit_length())
+
+            if common == child.length:
+                # The child's prefix covers the key: descend into it
+                if copy:
+                    child = child.copy()
+                    node.children[bit] = child
+                node = child
+                continue
+
+            if common == length:
+                # The new prefix sits between `node` and `child`
+                new_node = TrieNode(key, length, link)
+                new_node.children[self._bit(child.key, length)] = child
+            else:
+                # The two prefixes diverge: add a branching node for them
+                new_node = TrieNode(key & self._mask(common), common)
+                new_node.children[self._bit(child.key, common)] = child
+                new_node.children[self._bit(key, common)] = TrieNode(key, length, link)
+
+            node.children[bit] = new_node
+            return True
+
+    def insert(self, key: int, length: int, link) -> "PatriciaTrie":
+        """
+        Returns a new trie that also maps the prefix given by the top
+        `length` bits of `key` to `link`. Inserting an existing prefix
+        replaces its link. Costs O(length).
+        """
+        root = self.root.copy()
+        added = self._insert(root, key, length, link, copy=True)
+        return PatriciaTrie(self.width, root, self.size + added, self.version + 1)
+
+    def _find(self, key: int, length: int) -> list:
+        """
+        Returns the path of (node, bit) pairs from the root down to the node
+        holding exactly this prefix, ending with (node, None), or None if
+        the trie has no such node.
+        """
+        width = self.width
+        key &= self._mask(length)
+        path = []
+        node = self.root
+
+        while node.length < length:
+            if (key ^ node.key) >> (width - node.length):
+                return None
+            bit = self._bit(key, node.length)
+            path.append((node, bit))
+            node = node.children[bit]
+            if node is None:
+                return None
+
+        if node.length != length or node.key != key:
+            return None
+        path.append((node, None))
+        return path
+
+    def get(self, key: int, length: int):
+        """
+        Returns the link stored for exactly this prefix, or None.
+        """
+        path = self._find(key, length)
+        return path[-1][0].link if path else None
+
+    def remove(self, key: int, length: int) -> "PatriciaTrie":
+        """
+        Returns a new trie without the given prefix. Branching nodes left
+        with a single child are collapsed again. Costs O(length).
+        Raises KeyError if the prefix is not stored.
+        """
+        path = self._find(key, length)
+        if path is None or path[-1][0].link is None:
+            raise KeyError((key, length))
+
+        node = path.pop()[0]
+        if not path:
+            # The default route lives on the root, which always stays
+            replacement = node.copy()
+            replacement.link = None
+        else:
+            left, right = node.children
+            if left is not None and right is not None:
+                # Still needed as a branching point
+                replacement = node.copy()
+                replacement.link = None
+            else:
+                replacement = left if left is not None else right
+
+        # Copy the path back up to the root, dropping branching nodes
+        # that no longer branch
+        for depth in range(len(path) - 1, -1, -1):
+            parent = path[depth][0].copy()
+            parent.children[path[depth][1]] = replacement
+            left, right = parent.children
+            if depth and parent.link is None and (left is None or right is None):
+                replacement = left if left is not None else right
+            else:
+                replacement = parent
+
+        return PatriciaTrie(self.width, replacement, self.size - 1, self.version + 1)
+
+    def lookup(self, key: int):
+        """
+        Returns the link of the longest stored prefix matching `key`,
+        or None when no prefix matches.
+        """
+        width = self.width
+        best = None
+        node = self.root
+
+        while node is not None:
+            length = node.length
+            # Stop as soon as the compressed path diverges from the key
+            if (key ^ node.key) >> (width - length):
+                break
+            if node.link is not None:
+                best = node.link
+            if length == width:
+                break
+            node = node.children[(key >> (width - 1 - length)) & 1]
+
+        return best
+
+    def match(self, key: int, length: int):
+        """
+        Returns the link of the longest stored prefix of at most `length`
+        bits that covers key/length, or None.
+        """
+        width = self.width
+        key &= self._mask(length)
+        best = None
+        node = self.root
+
+        while node is not None and node.length <= length:
+            if (key ^ node.key) >> (width - node.length):
+                break
+            if node.link is not None:
+                best = node.link
+            if node.length == width:
+                break
+            node = node.children[self._bit(key, node.length)]
+
+        return best
+
+    def items(self, key: int = 0, length: int = 0):
+        """
+        Yields (key, length, link) for every stored prefix, in trie order.
+        With key/length, only the prefixes inside that prefix (itself
+        included) are visited.
+        """
+        width = self.width
+        key &= self._mask(length)
+        node = self.root
+        while node is not None and node.length < length:
+            if (key ^ node.key) >> (width - node.length):
+                return
+            node = node.children[self._bit(key, node.length)]
+        if node is None or (length and (key ^ node.key) >> (width - length)):
+            return
+
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.link is not None:
+                yield node.key, node.length, node.link
+            # Push the 1-branch first so the 0-branch is visited first
+            for child in reversed(node.children):
+                if child is not None:
+                    stack.append(child)
+
+    def __len__(self):
+        return self.size
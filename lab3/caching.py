@@ -1,60 +1,149 @@
 import http.server
 import socketserver
 import os
+import stat
 import hashlib
-import time
+import threading
+from collections import OrderedDict
 from email.utils import formatdate, parsedate_to_datetime
+from functools import partial
 
 PORT = 8080
-FILENAME = "index.html"
+# Only this directory is served, never the scripts next to it; "/" maps to index.html
+DOC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public")
+CACHE_BYTES = 16 * 1024 * 1024  # memory budget of the content cache
+
+class CacheEntry:
+    __slots__ = ("mtime_ns", "stat_size", "size", "body", "etag", "last_modified", "mtime")
+
+    OVERHEAD = 256  # rough bytes per entry besides the body, charged to the budget
+
+    def __init__(self, st, body, keep_body):
+        self.mtime_ns = st.st_mtime_ns
+        self.stat_size = st.st_size  # validates the entry against later stats
+        self.size = len(body)        # what is actually served
+        self.body = body if keep_body else None
+        self.etag = hashlib.md5(body).hexdigest()
+        self.mtime = int(st.st_mtime)  # Last-Modified has whole-second resolution
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+
+    @property
+    def cost(self):
+        return self.OVERHEAD + (len(self.body) if self.body is not None else 0)
+
+class ContentCache:
+    """
+    File bodies and their validators, keyed on path. An entry is valid
+    while the file's mtime and size match a fresh stat, so a hit costs one
+    stat and no reads or hashing. Entries are evicted least recently used
+    first once they exceed `budget` bytes; a file bigger than a quarter of
+    the budget only has its validators cached.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, st):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.stat_size == st.st_size:
+                self._entries.move_to_end(path)
+                return entry
+        return None
+
+    def load(self, path):
+        """Reads the file and caches it. Returns (entry, body); raises OSError."""
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())  # the validators match exactly what was read
+            body = f.read()
+        entry = CacheEntry(st, body, keep_body=len(body) <= self.budget // 4)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.used -= old.cost
+            self._entries[path] = entry
+            self.used += entry.cost
+            while self.used > self.budget:
+                _, victim = self._entries.popitem(last=False)
+                self.used -= victim.cost
+        return entry, body
 
 class CachingHandler(http.server.SimpleHTTPRequestHandler):
+    cache = ContentCache(CACHE_BYTES)
+
     def do_GET(self):
-        if self.path != f"/{FILENAME}":
-            self.send_error(404, "File Not Found")
-            return
+        self.serve(send_body=True)
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
 
-        # Read file content
+    def serve(self, send_body):
+        # translate_path strips the query and any ".." that would leave the root
+        path = self.translate_path(self.path)
         try:
-            with open(FILENAME, "rb") as f:
-                content = f.read()
-        except FileNotFoundError:
+            st = os.stat(path)
+            if stat.S_ISDIR(st.st_mode):
+                path = os.path.join(path, "index.html")
+                st = os.stat(path)
+        except OSError:
             self.send_error(404, "File Not Found")
             return
 
-        # Generate ETag (MD5 hash of file content)
-        etag = hashlib.md5(content).hexdigest()
-
-        # Get Last-Modified time
-        last_mod_time = os.path.getmtime(FILENAME)
-        last_modified = formatdate(last_mod_time, usegmt=True)
+        entry = self.cache.get(path, st)
+        body = entry.body if entry is not None else None
+        if entry is None:
+            try:
+                entry, body = self.cache.load(path)
+            except OSError:
+                self.send_error(404, "File Not Found")
+                return
 
         # Check request headers
         if_none_match = self.headers.get("If-None-Match")
         if_modified_since = self.headers.get("If-Modified-Since")
 
         # Validate caching headers
-        if (
-            if_none_match == etag or
-            (
-                if_modified_since and
-                parsedate_to_datetime(if_modified_since).timestamp() >= last_mod_time
-            )
-        ):
+        if if_none_match == entry.etag or self.not_modified_since(if_modified_since, entry):
             self.send_response(304)
+            self.send_header("ETag", entry.etag)
+            self.send_header("Last-Modified", entry.last_modified)
             self.end_headers()
             return
 
+        if body is None and send_body:
+            # Too large to keep in memory: read it again, with fresh validators
+            try:
+                entry, body = self.cache.load(path)
+            except OSError:
+                self.send_error(404, "File Not Found")
+                return
+
         # Send 200 OK with content
         self.send_response(200)
-        self.send_header("Content-Type", "text/html")
-        self.send_header("ETag", etag)
-        self.send_header("Last-Modified", last_modified)
-        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("ETag", entry.etag)
+        self.send_header("Last-Modified", entry.last_modified)
+        self.send_header("Content-Length", str(entry.size))
         self.end_headers()
-        self.wfile.write(content)
+        if send_body:
+            self.wfile.write(body)
+
+    @staticmethod
+    def not_modified_since(if_modified_since, entry):
+        if not if_modified_since:
+            return False
+        if if_modified_since == entry.last_modified:
+            return True  # the client echoed our header: no date parsing needed
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= entry.mtime
+        except (TypeError, ValueError):
+            return False  # an invalid date is ignored
 
 if __name__ == "__main__":
-    with socketserver.TCPServer(("", PORT), CachingHandler) as httpd:
-        print(f"📦 Serving '{FILENAME}' with caching support on port {PORT}...")
+    handler = partial(CachingHandler, directory=DOC_ROOT)
+    with socketserver.TCPServer(("", PORT), handler) as httpd:
+        print(f"📦 Serving '{os.path.abspath(DOC_ROOT)}' with caching support on port {PORT}...")
         httpd.serve_forever()
@@ -0,0 +1,204 @@
+from __future__ import annotations
+import json
+import select
+import socket
+import threading
+import time
+from typing import Optional, TextIO
+
+from common import REPORT_STRUCT, Report
+from reassembly import ReassemblyManager
+
+
+class FeedbackReporter:
+    """
+    Client side of the feedback channel: every `interval` seconds, sends a
+    Report with the reassembly counters and the frame jitter back to the
+    address the stream comes from.
+
+    Jitter is the smoothed variation of the gap between completed frames
+    (the RFC 3550 estimator, without sender timestamps).
+    """
+
+    def __init__(self, sock: socket.socket, frames: ReassemblyManager, interval: float = 0.5):
+        self.sock = sock
+        self.frames = frames
+        self.interval = interval
+        self.seq = 0
+        self.jitter = 0.0
+        self._last_arrival = None
+        self._last_gap = None
+        self._next_report = 0.0
+
+    def on_frame(self, now: float):
+        """Call for every completed frame."""
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            if self._last_gap is not None:
+                self.jitter += (abs(gap - self._last_gap) - self.jitter) / 16
+            self._last_gap = gap
+        self._last_arrival = now
+
+    def maybe_report(self, now: float, server) -> bool:
+        """Sends a report to `server` if one is due. Returns whether it did."""
+        if server is None or now < self._next_report:
+            return False
+        self._next_report = now + self.interval
+        frames = self.frames
+        self.seq += 1
+        report = Report(
+            self.seq, frames.packets_expected, frames.packets_received, frames.completed,
+            frames.expired + frames.evicted + frames.superseded, int(self.jitter * 1e6),
+        )
+        try:
+            self.sock.sendto(report.pack(), server)
+        except OSError:
+            return False
+        return True
+
+
+class BitrateController:
+    """
+    Server side: turns receiver reports into quality, resolution and
+    frame-rate settings.
+
+    Each report is compared with the previous one to get the packet loss
+    and the share of frames delivered over the interval. On congestion the
+    controller steps down right away: JPEG quality first (cheapest to
+    lose), then the resolution scale, then the frame rate. After
+    `stable_reports` clean intervals in a row it steps back up in the
+    reverse order, one step at a time, never above the configured settings.
+    """
+
+    def __init__(self, quality: int, scale: float, fps: float, min_quality: int = 25,
+                 min_scale: float = 0.25, min_fps: float = 5.0, loss_high: float = 0.05,
+                 loss_low: float = 0.01, stable_reports: int = 3, log: Optional[TextIO] = None):
+        self.max_quality, self.max_scale, self.max_fps = quality, scale, fps
+        self.quality, self.scale, self.fps = quality, scale, fps
+        self.min_quality = min(min_quality, quality)
+        self.min_scale = min(min_scale, scale)
+        self.min_fps = min(min_fps, fps)
+        self.loss_high = loss_high
+        self.loss_low = loss_low
+        self.stable_reports = stable_reports
+        self.log = log
+        self._last: Optional[Report] = None
+        self._last_time = 0.0
+        self._clean = 0
+        self._scale_level = 0
+        self._fps_level = 0
+        self.decisions = 0
+
+    # Scale and FPS move along geometric ladders, so stepping down and back
+    # up lands exactly on the configured values again
+    STEP = 0.75
+
+    def _apply_levels(self):
+        self.scale = max(self.min_scale, round(self.max_scale * self.STEP ** self._scale_level, 3))
+        self.fps = max(self.min_fps, self.max_fps * self.STEP ** self._fps_level)
+
+    def _step_down(self) -> str:
+        if self.quality > self.min_quality:
+            self.quality = max(self.min_quality, self.quality - 15)
+            return "quality-down"
+        if self.scale > self.min_scale:
+            self._scale_level += 1
+            self._apply_levels()
+            return "scale-down"
+        if self.fps > self.min_fps:
+            self._fps_level += 1
+            self._apply_levels()
+            return "fps-down"
+        return "at-floor"
+
+    def _step_up(self) -> Optional[str]:
+        if self._fps_level:
+            self._fps_level -= 1
+            self._apply_levels()
+            return "fps-up"
+        if self._scale_level:
+            self._scale_level -= 1
+            self._apply_levels()
+            return "scale-up"
+        if self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + 5)
+            return "quality-up"
+        return None
+
+    def on_report(self, report: Report, now: float) -> Optional[str]:
+        """
+        Feeds one receiver report. Returns the action taken, if the
+        settings changed.
+        """
+        last, self._last = self._last, report
+        last_time, self._last_time = self._last_time, now
+        # The first report, a client restart or a reordered report: no interval to judge
+        if last is None or report.seq <= last.seq or report.packets_expected < last.packets_expected:
+            return None
+
+        expected = report.packets_expected - last.packets_expected
+        received = report.packets_received - last.packets_received
+        completed = report.frames_completed - last.frames_completed
+        lost = report.frames_lost - last.frames_lost
+        # Packets are expected when a frame's first packet arrives, so an
+        # interval can end up slightly negative; it evens out over the next
+        loss = max(0.0, 1.0 - received / expected) if expected else 0.0
+        delivery = completed / (completed + lost) if completed + lost else 1.0
+        elapsed = now - last_time
+
+        action = None
+        if loss > self.loss_high or delivery < 0.9:
+            self._clean = 0
+            action = self._step_down()
+        elif loss < self.loss_low and delivery >= 0.98:
+            self._clean += 1
+            if self._clean >= self.stable_reports:
+                self._clean = 0
+                action = self._step_up()
+        else:
+            self._clean = 0
+
+        entry = {
+            "time": round(now, 3), "loss": round(loss, 4), "delivery": round(delivery, 4),
+            "delivered_fps": round(completed / elapsed, 2) if elapsed > 0 else 0.0,
+            "jitter_ms": report.jitter_us / 1000, "action": action,
+            "quality": self.quality, "scale": self.scale, "fps": round(self.fps, 2),
+        }
+        if self.log is not None:
+            self.log.write(json.dumps(entry) + "\n")
+            self.log.flush()
+        if action is not None and action != "at-floor":
+            self.decisions += 1
+            print(f"[ABR] {action}: loss {loss:.1%}, delivery {delivery:.0%}, "
+                  f"{entry['delivered_fps']} fps delivered -> quality {self.quality}, "
+                  f"scale {self.scale}, {self.fps:.1f} fps")
+            return action
+        return None
+
+
+def listen_for_reports(sock: socket.socket, controller: BitrateController, on_change,
+                       stop: threading.Event):
+    """
+    Reads receiver reports arriving on the server's sending socket and
+    calls on_change(controller) whenever the controller changes a setting.
+    Runs until `stop` is set; meant for a daemon thread.
+    """
+    buf = bytearray(2 * REPORT_STRUCT.size)
+    while not stop.is_set():
+        # select() instead of a socket timeout: a timeout would make the
+        # socket non-blocking for the sender's sendmmsg as well
+        try:
+            readable, _, _ = select.select([sock], [], [], 0.2)
+            if not readable:
+                continue
+            nbytes = sock.recv_into(buf)
+        except (OSError, ValueError):
+            break  # socket closed
+        if nbytes != REPORT_STRUCT.size:
+            continue
+        try:
+            report = Report.unpack(bytes(buf[:nbytes]))
+        except ValueError:
+            continue
+        if controller.on_report(report, time.time()):
+            on_change(controller)
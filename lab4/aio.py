@@ -0,0 +1,292 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import socket
+import time
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from common import Header, FLAG_MARKER, MAX_PAYLOAD, SUBSCRIBE, UNSUBSCRIBE, control_message
+from reassembly import ReassemblyManager
+
+# asyncio versions of the client and server. Everything is driven by the
+# event loop: datagrams arrive through DatagramProtocol callbacks, frame
+# timeouts are loop timers, and the sender awaits its pacing deadlines.
+# One process can run many stream sessions without a thread per stream;
+# JPEG encode/decode and capture run in the loop's default executor.
+
+
+class ReceiverProtocol(asyncio.DatagramProtocol):
+    """
+    One receiving session. Datagrams go straight into a ReassemblyManager
+    and every completed frame is passed to on_frame(frame_id, view); the
+    view is only valid during the call.
+
+    Instead of polling, a single loop timer is armed for the deadline of
+    the oldest pending frame (the front of the manager's arrival order)
+    and re-armed after each expiry. With `subscribe_to`, a SUBSCRIBE
+    keepalive is sent to a fan-out server every 2 s.
+    """
+
+    def __init__(self, on_frame: Callable[[int, memoryview], None], timeout: float = 2.0,
+                 window: int = 50, max_payload: int = MAX_PAYLOAD,
+                 subscribe_to: Optional[Tuple[str, int]] = None):
+        self.on_frame = on_frame
+        self.frames = ReassemblyManager(timeout, window, max_payload)
+        self.subscribe_to = subscribe_to
+        self.transport = None
+        self._expiry: Optional[asyncio.TimerHandle] = None
+        self._keepalive: Optional[asyncio.TimerHandle] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.subscribe_to is not None:
+            self._subscribe()
+
+    def _subscribe(self):
+        self.transport.sendto(control_message(SUBSCRIBE), self.subscribe_to)
+        self._keepalive = asyncio.get_running_loop().call_later(2.0, self._subscribe)
+
+    def datagram_received(self, data: bytes, addr):
+        frames = self.frames
+        frame = frames.on_packet(memoryview(data), time.time())
+        if frame is not None:
+            try:
+                self.on_frame(frame.frame_id, frame.view())
+            finally:
+                frames.release(frame)
+        if frames.frames and self._expiry is None:
+            self._arm()
+
+    def _arm(self):
+        oldest = next(iter(self.frames.frames.values()))
+        delay = oldest.start_time + self.frames.timeout - time.time()
+        self._expiry = asyncio.get_running_loop().call_later(max(0.0, delay) + self.frames.wheel.tick,
+                                                             self._expire)
+
+    def _expire(self):
+        self._expiry = None
+        self.frames.expire(time.time())
+        if self.frames.frames:
+            self._arm()
+
+    def error_received(self, exc):
+        pass  # e.g. ICMP port unreachable for a keepalive; keep receiving
+
+    def close(self):
+        for handle in (self._expiry, self._keepalive):
+            if handle is not None:
+                handle.cancel()
+        if self.transport is not None:
+            if self.subscribe_to is not None:
+                self.transport.sendto(control_message(UNSUBSCRIBE), self.subscribe_to)
+            self.transport.close()
+
+
+class SenderProtocol(asyncio.DatagramProtocol):
+    """Sending side of a session; only tracks transport errors."""
+
+    def __init__(self):
+        self.errors = 0
+
+    def error_received(self, exc):
+        self.errors += 1
+
+
+async def send_frame(transport: asyncio.DatagramTransport, frame_id: int, data: np.ndarray,
+                     target: Tuple[str, int], max_payload: int = MAX_PAYLOAD, burst: int = 32) -> int:
+    """
+    Packetizes one encoded frame with common.Header and sends it, yielding
+    to the loop every `burst` datagrams so concurrent sessions interleave.
+    Returns the number of datagrams sent.
+    """
+    view = memoryview(data.reshape(-1))
+    total = (len(view) + max_payload - 1) // max_payload
+    for idx in range(total):
+        payload = view[idx * max_payload:(idx + 1) * max_payload]
+        header = Header(flags=FLAG_MARKER if idx == total - 1 else 0, frame_id=frame_id & 0xFFFFFFFF,
+                        packet_idx=idx, total_packets=total, payload_size=len(payload)).pack()
+        transport.sendto(header + payload, target)
+        if (idx + 1) % burst == 0:
+            await asyncio.sleep(0)
+    return total
+
+
+async def serve_stream(source, target: Tuple[str, int], fps: float, quality: int = 70,
+                       scale: float = 1.0, max_payload: int = MAX_PAYLOAD,
+                       max_buffered: int = 4 << 20) -> dict:
+    """
+    Streams one source (anything with cv2.VideoCapture's read()) to
+    `target` until it ends. Frames are sent on a fixed schedule of
+    loop.time() deadlines; a frame whose deadline passed while it was being
+    read or encoded, or that would pile onto more than `max_buffered` bytes
+    still queued in the transport, is dropped.
+    """
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(SenderProtocol, family=socket.AF_INET)
+    param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    interval = 1.0 / fps
+    stats = {"sent": 0, "late_dropped": 0, "buffer_dropped": 0, "packets": 0}
+
+    def encode():
+        ok, frame = source.read()
+        if not ok:
+            return None
+        if scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", frame, param)
+        return buf if ok else np.empty(0, dtype=np.uint8)
+
+    deadline = loop.time()
+    frame_id = 0
+    try:
+        while True:
+            buf = await loop.run_in_executor(None, encode)
+            if buf is None:
+                break
+            now = loop.time()
+            if now > deadline + interval:
+                stats["late_dropped"] += 1
+                deadline = now  # re-anchor instead of bursting to catch up
+            elif transport.get_write_buffer_size() > max_buffered:
+                stats["buffer_dropped"] += 1
+            elif buf.size:
+                await asyncio.sleep(max(0.0, deadline - now))
+                stats["packets"] += await send_frame(transport, frame_id, buf, target, max_payload)
+                stats["sent"] += 1
+            frame_id += 1
+            deadline += interval
+    finally:
+        transport.close()
+    stats["errors"] = protocol.errors
+    return stats
+
+
+async def run_clients(bind: str, ports: List[int], duration: float, show: bool,
+                      subscribe_to: Optional[Tuple[str, int]], **options) -> dict:
+    """
+    Receives one session per port until `duration` elapses (0 = forever).
+    Returns each port's reassembly counters plus the frames it showed.
+    """
+    loop = asyncio.get_running_loop()
+    sessions = []
+    shown = {port: 0 for port in ports}  # decoded and displayed with --show
+
+    def decode(data: bytes):
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def start_decode(port: int, display: dict, data: bytes):
+        display["busy"] = True
+        future = loop.run_in_executor(None, decode, data)
+        future.add_done_callback(lambda done: show_image(port, display, done))
+
+    def show_image(port: int, display: dict, done: asyncio.Future):
+        # Back on the loop thread; imshow itself is quick
+        image = None if done.cancelled() or done.exception() else done.result()
+        if image is not None:
+            cv2.imshow(f"UDP Video Client :{port}", image)
+            cv2.waitKey(1)
+            shown[port] += 1
+        data, display["pending"] = display["pending"], None
+        display["busy"] = False
+        if data is not None:
+            start_decode(port, display, data)
+
+    for port in ports:
+        # One decode in flight per session; frames arriving meanwhile keep only the newest
+        display = {"busy": False, "pending": None}
+
+        def on_frame(frame_id: int, view: memoryview, port=port, display=display):
+            if not show:
+                return
+            data = bytes(view)  # the view is only valid during this call
+            if display["busy"]:
+                display["pending"] = data
+            else:
+                start_decode(port, display, data)
+
+        _, protocol = await loop.create_datagram_endpoint(
+            lambda: ReceiverProtocol(on_frame, subscribe_to=subscribe_to, **options),
+            local_addr=(bind, port),
+        )
+        sessions.append((port, protocol))
+        print(f"[CLIENT] Listening on {bind}:{port}")
+
+    try:
+        if duration > 0:
+            await asyncio.sleep(duration)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        for _, protocol in sessions:
+            protocol.close()
+        if show:
+            cv2.destroyAllWindows()
+    return {port: {**protocol.frames.stats(), "shown": shown[port]} for port, protocol in sessions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="asyncio UDP video streaming (many sessions per process)")
+    sub = parser.add_subparsers(dest="role", required=True)
+
+    server = sub.add_parser("server", help="Stream to one or more clients")
+    server.add_argument("--video", action="append", required=True,
+                        help="Video file, RTSP URL or webcam index; repeat for more sessions")
+    server.add_argument("--target", action="append", required=True,
+                        help="HOST:PORT per --video (one video may feed several targets)")
+    server.add_argument("--fps", type=float, default=25.0, help="Frames per second per session")
+    server.add_argument("--jpeg-quality", type=int, default=70, help="JPEG quality 1-100")
+    server.add_argument("--scale", type=float, default=1.0, help="Resize factor for frames")
+    server.add_argument("--max-payload", type=int, default=MAX_PAYLOAD, help="Max payload bytes per UDP packet")
+
+    client = sub.add_parser("client", help="Receive one session per port")
+    client.add_argument("--bind", default="0.0.0.0", help="IP address to bind")
+    client.add_argument("--port", type=int, action="append", required=True, help="UDP port; repeat for more sessions")
+    client.add_argument("--server", help="HOST:PORT of a fan-out server to subscribe to")
+    client.add_argument("--timeout", type=float, default=2.0, help="Seconds before dropping incomplete frames")
+    client.add_argument("--window", type=int, default=50, help="Max frames to keep in reassembly window")
+    client.add_argument("--max-payload", type=int, default=MAX_PAYLOAD, help="Payload bytes per packet used by the server")
+    client.add_argument("--duration", type=float, default=0.0, help="Stop after this many seconds (0 = Ctrl+C)")
+    client.add_argument("--show", action="store_true", help="Decode and display every session")
+    args = parser.parse_args()
+
+    if args.role == "server":
+        videos = args.video * len(args.target) if len(args.video) == 1 else args.video
+        if len(videos) != len(args.target):
+            parser.error("give one --video, or one per --target")
+
+        async def serve_all():
+            sessions = []
+            for video, target in zip(videos, args.target):
+                host, port = target.rsplit(":", 1)
+                cap = cv2.VideoCapture(int(video) if video.isdigit() else video)
+                if not cap.isOpened():
+                    raise RuntimeError(f"Failed to open video source: {video}")
+                sessions.append(serve_stream(cap, (host, int(port)), args.fps, args.jpeg_quality,
+                                             args.scale, args.max_payload))
+            return await asyncio.gather(*sessions)
+
+        try:
+            results = asyncio.run(serve_all())
+            for target, stats in zip(args.target, results):
+                print(f"[SERVER] {target}: {stats}")
+        except KeyboardInterrupt:
+            print("\n[SERVER] Interrupted by user. Exiting.")
+    else:
+        subscribe_to = None
+        if args.server:
+            host, port = args.server.rsplit(":", 1)
+            subscribe_to = (socket.gethostbyname(host), int(port))
+        try:
+            stats = asyncio.run(run_clients(args.bind, args.port, args.duration, args.show, subscribe_to,
+                                            timeout=args.timeout, window=args.window,
+                                            max_payload=args.max_payload))
+            print(json.dumps(stats, indent=2))
+        except KeyboardInterrupt:
+            print("\n[CLIENT] Interrupted by user. Exiting.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+import argparse
+import random
+import socket
+
+import numpy as np
+
+from common import MAX_PAYLOAD
+from reassembly import ReassemblyManager
+from sender import FrameSender
+
+def run(fec: int, losses: list, frames: int, frame_size: int, max_payload: int, seed: int) -> dict:
+    """
+    Streams `frames` frames over loopback with the given FEC group size and
+    feeds the received datagrams, with random drops at each loss rate, to a
+    client-side ReassemblyManager. Returns {loss: (completed, recovered)}
+    and the datagrams sent per frame.
+    """
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+    sink.bind(("127.0.0.1", 0))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender = FrameSender(sock, max_payload, fec=fec)
+
+    rng = np.random.default_rng(seed)
+    drop = random.Random(seed)
+    managers = {loss: ReassemblyManager(stride=max_payload) for loss in losses}
+    datagrams = 0
+    for frame_id in range(frames):
+        # Sizes vary around frame_size, like JPEG frames do
+        size = max(1, int(rng.normal(frame_size, frame_size / 10)))
+        count = sender.send_frame(frame_id, rng.integers(0, 256, size, dtype=np.uint8), sink.getsockname())
+        packets = [sink.recv(65535) for _ in range(count)]
+        datagrams += count
+        for loss, manager in managers.items():
+            for packet in packets:
+                if drop.random() < loss:
+                    continue
+                frame = manager.on_packet(memoryview(packet), frame_id)
+                if frame is not None:
+                    manager.release(frame)
+
+    sock.close()
+    sink.close()
+    results = {loss: (m.completed, m.recovered) for loss, m in managers.items()}
+    return {"results": results, "datagrams_per_frame": datagrams / frames}
+
+def main():
+    parser = argparse.ArgumentParser(description="Delivered FPS versus packet loss, with and without FEC, over loopback")
+    parser.add_argument("--frames", type=int, default=500, help="Frames to send per FEC setting")
+    parser.add_argument("--frame-size", type=int, default=60_000, help="Mean encoded frame size in bytes")
+    parser.add_argument("--fps", type=float, default=30.0, help="Nominal stream FPS, to express delivery as FPS")
+    parser.add_argument("--loss", default="0,0.005,0.01,0.02,0.05", help="Comma-separated packet loss rates")
+    parser.add_argument("--fec", default="0,16,8,4", help="Comma-separated FEC group sizes (0 = off)")
+    parser.add_argument("--max-payload", type=int, default=MAX_PAYLOAD, help="Max payload bytes per UDP packet")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    losses = [float(x) for x in args.loss.split(",")]
+    print(f"{args.frames} frames of ~{args.frame_size:,} bytes at {args.fps:g} FPS; delivered FPS per loss rate")
+    print(f"{'fec':>5} {'overhead':>9} " + " ".join(f"{loss:>8.1%}" for loss in losses))
+    baseline = None
+    for fec in (int(x) for x in args.fec.split(",")):
+        result = run(fec, losses, args.frames, args.frame_size, args.max_payload, args.seed)
+        if baseline is None:
+            baseline = result["datagrams_per_frame"] if fec == 0 else None
+        overhead = f"{result['datagrams_per_frame'] / baseline - 1:>8.1%}" if baseline else f"{'':>8}"
+        fps = [completed / args.frames * args.fps for completed, _ in result["results"].values()]
+        print(f"{fec or 'off':>5} {overhead:>9} " + " ".join(f"{value:>8.1f}" for value in fps))
+
+if __name__ == "__main__":
+    main()
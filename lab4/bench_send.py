@@ -0,0 +1,73 @@
+from __future__ import annotations
+import argparse
+import socket
+import time
+
+import numpy as np
+
+from common import Header, FLAG_MARKER, MAX_PAYLOAD
+from sender import FrameSender, SEND_MODES, best_send_mode
+
+def legacy_send(sock: socket.socket, frame_id: int, buf: np.ndarray, target, max_payload: int):
+    """The original server send path: tobytes(), a list of slices, a Header per chunk, header + payload."""
+    data = buf.tobytes()
+    chunks = [data[i:i + max_payload] for i in range(0, len(data), max_payload)]
+    total = len(chunks)
+    for idx, payload in enumerate(chunks):
+        flags = FLAG_MARKER if (idx == total - 1) else 0
+        header = Header(flags=flags, frame_id=frame_id, packet_idx=idx,
+                        total_packets=total, payload_size=len(payload)).pack()
+        sock.sendto(header + payload, target)
+    return total
+
+def run(mode: str, frames: int, frame_size: int, max_payload: int, target) -> dict:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 << 20)
+    # A JPEG-sized random buffer, as returned by cv2.imencode
+    buf = np.random.default_rng(0).integers(0, 256, size=(frame_size, 1), dtype=np.uint8)
+
+    if mode == "legacy":
+        send = lambda fid: legacy_send(sock, fid, buf, target, max_payload)
+    else:
+        sender = FrameSender(sock, max_payload, mode)
+        send = lambda fid: sender.send_frame(fid, buf, target)
+
+    packets = 0
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for frame_id in range(frames):
+        packets += send(frame_id)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    sock.close()
+    return {
+        "packets_per_s": packets / wall,
+        "cpu_us_per_frame": cpu / frames * 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the server's datagram send paths over loopback")
+    parser.add_argument("--frames", type=int, default=2000, help="Frames to send per mode")
+    parser.add_argument("--frame-size", type=int, default=200_000, help="Encoded frame size in bytes")
+    parser.add_argument("--max-payload", type=int, default=MAX_PAYLOAD, help="Max payload bytes per UDP packet")
+    parser.add_argument("--port", type=int, default=5999, help="Loopback port of the (unread) sink socket")
+    args = parser.parse_args()
+
+    # Bound so the datagrams have somewhere to go; nobody reads it
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", args.port))
+    target = ("127.0.0.1", args.port)
+
+    modes = ["legacy"] + [m for m in SEND_MODES if m != "auto"]
+    if best_send_mode() != "sendmmsg":
+        modes.remove("sendmmsg")
+
+    print(f"{args.frames} frames of {args.frame_size:,} bytes, payload {args.max_payload} bytes")
+    print(f"{'mode':>10} {'packets/s':>12} {'CPU us/frame':>13}")
+    for mode in modes:
+        result = run(mode, args.frames, args.frame_size, args.max_payload, target)
+        print(f"{mode:>10} {result['packets_per_s']:>12,.0f} {result['cpu_us_per_frame']:>13,.1f}")
+    sink.close()
+
+if __name__ == "__main__":
+    main()
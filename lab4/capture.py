@@ -0,0 +1,266 @@
+from __future__ import annotations
+import argparse
+import mmap
+import random
+import socket
+import struct
+import time
+from typing import Iterator, Optional, Tuple
+
+from common import MAX_PAYLOAD, SUBSCRIBE, UNSUBSCRIBE, control_message
+from reassembly import ReassemblyManager, ReceiveRing
+from telemetry import write_json
+
+# Capture file: FILE_STRUCT once, then one record per datagram, appended
+# as it arrives: RECORD_STRUCT (arrival time in microseconds since the
+# epoch, datagram length) followed by the datagram bytes. A capture cut
+# short mid-record is read up to its last complete record.
+FILE_MAGIC = b"VSCP"
+FILE_VERSION = 1
+FILE_STRUCT = struct.Struct("!4sBxxx")     # magic(4s), version(B), 3 pad bytes
+RECORD_STRUCT = struct.Struct("!QH")       # timestamp_us(Q), length(H)
+
+
+class Recorder:
+    """Appends datagrams with their arrival time to a capture file."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "wb")
+        self._file.write(FILE_STRUCT.pack(FILE_MAGIC, FILE_VERSION))
+        self.datagrams = 0
+        self.bytes = 0
+
+    def record(self, datagram, now: Optional[float] = None):
+        if now is None:
+            now = time.time()
+        self._file.write(RECORD_STRUCT.pack(int(now * 1e6), len(datagram)))
+        self._file.write(datagram)
+        self.datagrams += 1
+        self.bytes += len(datagram)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "Recorder":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Replayer:
+    """
+    Reads a capture file through mmap: datagrams() yields zero-copy views
+    into the mapping, so replay costs no reads or copies of its own. Views
+    must not be kept past close().
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if len(self._view) < FILE_STRUCT.size:
+            self.close()
+            raise ValueError(f"{path} is not a capture file")
+        magic, version = FILE_STRUCT.unpack_from(self._view)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {FILE_VERSION} capture file")
+
+    def datagrams(self) -> Iterator[Tuple[float, memoryview]]:
+        """Yields (arrival time in seconds, datagram) in recorded order."""
+        view = self._view
+        offset = FILE_STRUCT.size
+        end = len(view)
+        while offset + RECORD_STRUCT.size <= end:
+            timestamp, length = RECORD_STRUCT.unpack_from(view, offset)
+            offset += RECORD_STRUCT.size
+            if offset + length > end:
+                break  # truncated last record
+            yield timestamp / 1e6, view[offset:offset + length]
+            offset += length
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+
+    def __enter__(self) -> "Replayer":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def impair(datagrams: Iterator[Tuple[float, memoryview]], drop: float = 0.0, reorder: float = 0.0,
+           depth: int = 3, seed: int = 1) -> Iterator[Tuple[float, memoryview]]:
+    """
+    Injects faults into a datagram stream: each datagram is dropped with
+    probability `drop`, or with probability `reorder` held back and
+    delivered after the next `depth` datagrams, at their time. The same
+    seed gives the same faults for the same capture.
+    """
+    rng = random.Random(seed)
+    held = []  # [datagrams still to let pass, datagram]
+    for timestamp, datagram in datagrams:
+        if rng.random() < drop:
+            continue
+        if rng.random() < reorder:
+            held.append([depth, datagram])
+            continue
+        yield timestamp, datagram
+        for entry in held:
+            entry[0] -= 1
+        while held and held[0][0] <= 0:
+            yield timestamp, held.pop(0)[1]
+    for _, datagram in held:
+        yield timestamp, datagram
+
+
+def paced(datagrams: Iterator[Tuple[float, memoryview]], speed: float) -> Iterator[Tuple[float, memoryview]]:
+    """Releases each datagram at its recorded offset from the first, divided by `speed`."""
+    start = first = None
+    for timestamp, datagram in datagrams:
+        if first is None:
+            start, first = time.perf_counter(), timestamp
+        delay = start + (timestamp - first) / speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield timestamp, datagram
+
+
+def record(sock: socket.socket, recorder: Recorder, duration: float = 0.0,
+           subscription: Optional[Tuple[str, int]] = None):
+    """Records every datagram arriving on `sock` until `duration` elapses (0 = Ctrl+C)."""
+    ring = ReceiveRing(4)
+    deadline = time.time() + duration if duration > 0 else None
+    next_subscribe = 0.0
+    while deadline is None or time.time() < deadline:
+        if subscription is not None and time.time() >= next_subscribe:
+            sock.sendto(control_message(SUBSCRIBE), subscription)
+            next_subscribe = time.time() + 2.0
+        try:
+            datagram = ring.recv_into(sock)
+        except socket.timeout:
+            continue
+        recorder.record(datagram)
+
+
+def replay_to_socket(datagrams: Iterator[Tuple[float, memoryview]], sock: socket.socket,
+                     target: Tuple[str, int]) -> int:
+    sent = 0
+    for _, datagram in datagrams:
+        sock.sendto(datagram, target)
+        sent += 1
+    return sent
+
+
+def replay_to_reassembly(datagrams: Iterator[Tuple[float, memoryview]], frames: ReassemblyManager) -> int:
+    """
+    Feeds datagrams straight into a ReassemblyManager, with the recorded
+    arrival times as its clock, so timeouts behave the same at any replay
+    speed. Returns the number of datagrams fed.
+    """
+    fed = 0
+    for now, datagram in datagrams:
+        frame = frames.on_packet(datagram, now)
+        if frame is not None:
+            frames.release(frame)
+        frames.expire(now)
+        fed += 1
+    return fed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record a lab4 datagram stream to a file and replay it")
+    sub = parser.add_subparsers(dest="role", required=True)
+
+    rec = sub.add_parser("record", help="Record every datagram arriving on a UDP port")
+    rec.add_argument("file", help="Capture file to write")
+    rec.add_argument("--bind", default="0.0.0.0", help="IP address to bind")
+    rec.add_argument("--port", type=int, default=5000, help="UDP port the server sends to")
+    rec.add_argument("--server", help="HOST:PORT of a fan-out server (--listen-port) to subscribe to")
+    rec.add_argument("--multicast", help="Multicast group to join; the stream arrives on --port")
+    rec.add_argument("--duration", type=float, default=0.0, help="Stop after this many seconds (0 = Ctrl+C)")
+    rec.add_argument("--rcvbuf", type=int, default=8 << 20, help="Socket receive buffer in bytes")
+
+    play = sub.add_parser("replay", help="Replay a capture to a UDP socket or into the reassembly code")
+    play.add_argument("file", help="Capture file to read")
+    play.add_argument("--target", help="HOST:PORT to send the datagrams to (default: reassemble in-process)")
+    play.add_argument("--speed", type=float, default=1.0, help="Replay speed relative to the recording (0 = as fast as possible)")
+    play.add_argument("--drop", type=float, default=0.0, help="Probability of dropping each datagram")
+    play.add_argument("--reorder", type=float, default=0.0, help="Probability of delaying each datagram")
+    play.add_argument("--reorder-depth", type=int, default=3, help="Datagrams a delayed datagram falls behind")
+    play.add_argument("--seed", type=int, default=1, help="Seed for --drop and --reorder")
+    play.add_argument("--timeout", type=float, default=2.0, help="Seconds to wait before dropping incomplete frames")
+    play.add_argument("--window", type=int, default=50, help="Max frames to keep in reassembly window")
+    play.add_argument("--max-payload", type=int, default=MAX_PAYLOAD, help="Payload bytes per packet used by the server")
+    play.add_argument("--json", metavar="PATH", help="Write the reassembly counters as JSON ('-' = stdout)")
+    args = parser.parse_args()
+
+    if args.role == "record":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, args.rcvbuf)
+        sock.bind((args.bind, args.port))
+        sock.settimeout(0.1)
+        if args.multicast:
+            membership = socket.inet_aton(args.multicast) + socket.inet_aton("0.0.0.0")
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        subscription = None
+        if args.server:
+            host, port = args.server.rsplit(":", 1)
+            subscription = (socket.gethostbyname(host), int(port))
+        print(f"[CAPTURE] Recording {args.bind}:{args.port} to {args.file}")
+        with Recorder(args.file) as recorder:
+            try:
+                record(sock, recorder, args.duration, subscription)
+            except KeyboardInterrupt:
+                print("\n[CAPTURE] Interrupted by user. Exiting.")
+            finally:
+                if subscription is not None:
+                    sock.sendto(control_message(UNSUBSCRIBE), subscription)
+                sock.close()
+        print(f"[CAPTURE] Recorded {recorder.datagrams} datagrams, {recorder.bytes:,} bytes")
+        return
+
+    with Replayer(args.file) as replayer:
+        datagrams = replayer.datagrams()
+        if args.drop or args.reorder:
+            datagrams = impair(datagrams, args.drop, args.reorder, args.reorder_depth, args.seed)
+        if args.speed > 0:
+            datagrams = paced(datagrams, args.speed)
+        try:
+            replay(args, datagrams)
+        except KeyboardInterrupt:
+            print("\n[CAPTURE] Interrupted by user. Exiting.")
+        finally:
+            # Frees the view a suspended generator still holds, so the mapping can close
+            datagrams.close()
+
+
+def replay(args, datagrams: Iterator[Tuple[float, memoryview]]):
+    started = time.perf_counter()
+    if args.target:
+        host, port = args.target.rsplit(":", 1)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        count = replay_to_socket(datagrams, sock, (host, int(port)))
+        sock.close()
+        print(f"[CAPTURE] Sent {count} datagrams to {args.target} in {time.perf_counter() - started:.3f} s")
+        return
+
+    frames = ReassemblyManager(args.timeout, args.window, args.max_payload)
+    count = replay_to_reassembly(datagrams, frames)
+    elapsed = time.perf_counter() - started
+    summary = {
+        "datagrams": count,
+        "elapsed_s": round(elapsed, 3),
+        "datagrams_per_s": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        "frames": frames.stats(),
+    }
+    if args.json:
+        write_json(summary, args.json)
+    else:
+        print(f"[CAPTURE] Reassembled {count} datagrams in {elapsed:.3f} s "
+              f"({summary['datagrams_per_s']:,} datagrams/s): {frames.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,17 @@
 from __future__ import annotations
 import argparse
+import queue
 import socket
+import threading
 import time
-from collections import defaultdict, deque
-from typing import Dict, Tuple
-
 import cv2
 import numpy as np
 
-from common import Header, HEADER_SIZE, FLAG_MARKER
+from adaptive import FeedbackReporter
+from common import MAX_PAYLOAD, SUBSCRIBE, UNSUBSCRIBE, control_message, frame_is_newer
+from reassembly import MAX_FRAME_BYTES, LatestQueue, ReassemblyManager, ReceiveRing
+from telemetry import ClientTelemetry, write_json
+from tiles import TileCompositor
 
 def main():
     parser = argparse.ArgumentParser(description="UDP Video Streaming Client")
@@ -16,92 +19,202 @@ def main():
     parser.add_argument("--port", type=int, default=5000, help="UDP port to bind")
     parser.add_argument("--timeout", type=float, default=2.0, help="Seconds to wait before dropping incomplete frames")
     parser.add_argument("--window", type=int, default=50, help="Max frames to keep in reassembly window")
+    parser.add_argument("--max-payload", type=int, default=MAX_PAYLOAD, help="Payload bytes per packet used by the server")
+    parser.add_argument("--max-frame", type=int, default=MAX_FRAME_BYTES,
+                        help="Largest frame in bytes to reassemble; bigger headers are rejected")
+    parser.add_argument("--ring", type=int, default=64, help="Preallocated receive buffers")
+    parser.add_argument("--decoders", type=int, default=2, help="JPEG decoder threads")
+    parser.add_argument("--tile-queue", type=int, default=30,
+                        help="Tiled-stream frames waiting for the compositor; more are dropped")
+    parser.add_argument("--server", help="HOST:PORT of a fan-out server (--listen-port) to subscribe to")
+    parser.add_argument("--multicast", help="Multicast group to join; the stream arrives on --port")
+    parser.add_argument("--report-interval", type=float, default=0.5,
+                        help="Seconds between receiver reports to the server (0 = off)")
+    parser.add_argument("--headless", action="store_true", help="Decode but do not display (no OpenCV window)")
+    parser.add_argument("--duration", type=float, default=0.0, help="Stop after this many seconds (0 = until 'q'/Ctrl+C)")
+    parser.add_argument("--json", metavar="PATH", help="Write a JSON summary of the run on exit ('-' = stdout)")
+    parser.add_argument("--rcvbuf", type=int, default=0, help="Socket receive buffer in bytes (0 = system default)")
     args = parser.parse_args()
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if args.rcvbuf:
+        # Absorbs bursts while the receiver is descheduled; Linux caps it at net.core.rmem_max
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, args.rcvbuf)
     sock.bind((args.bind, args.port))
     sock.settimeout(0.1)
-
-    print(f"[CLIENT] Listening on {args.bind}:{args.port}")
-
-    # Reassembly buffers
-    # frame_id -> (start_time, total_packets, received_count, dict(packet_idx->bytes))
-    buffers: Dict[int, Tuple[float, int, int, Dict[int, bytes]]] = {}
-
-    last_display = time.time()
-
+    if args.multicast:
+        membership = socket.inet_aton(args.multicast) + socket.inet_aton("0.0.0.0")
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    subscription = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        subscription = (socket.gethostbyname(host), int(port))
+
+    print(f"[CLIENT] Listening on {args.bind}:{args.port}, "
+          f"receive buffer {sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} bytes")
+
+    # Receive -> decode -> display, each stage on its own thread(s) so the
+    # socket is drained while frames decode. The hand-offs keep only the
+    # newest frame: the display never lags behind the stream. Frames of a
+    # tiled stream (server --tiles) build on each other, so they instead
+    # go through a bounded FIFO to a single compositor thread. A frame that
+    # finds the FIFO full is dropped, and the compositor resyncs on the
+    # next keyframe.
+    frames = ReassemblyManager(args.timeout, args.window, args.max_payload, max_frame=args.max_frame)
+    reporter = FeedbackReporter(sock, frames, args.report_interval) if args.report_interval > 0 else None
+    to_decode = LatestQueue()
+    to_display = LatestQueue()
+    stop = threading.Event()
+    # [frames decoded, decode errors] per decoding thread, summed on exit,
+    # so no thread increments a counter another one writes
+    counts = [[0, 0] for _ in range(max(1, args.decoders) + 1)]
+    telemetry = ClientTelemetry()
+    tiled = queue.Queue(max(1, args.tile_queue))
+    tiled_dropped = [0]  # tiled-stream frames dropped on a full FIFO
+    compositor = TileCompositor()
+
+    threads = [threading.Thread(target=receive_loop, args=(sock, args.ring, frames, to_decode, stop, reporter, subscription, telemetry, tiled, tiled_dropped),
+                                name="receiver", daemon=True)]
+    threads += [threading.Thread(target=composite_loop, args=(frames, tiled, to_display, stop, counts[0], compositor),
+                                 name="compositor", daemon=True)]
+    threads += [threading.Thread(target=decode_loop, args=(frames, to_decode, to_display, stop, counts[i + 1]),
+                                 name=f"decoder-{i}", daemon=True) for i in range(max(1, args.decoders))]
+    for thread in threads:
+        thread.start()
+
+    shown = 0
+    last_shown = -1
+    deadline = time.time() + args.duration if args.duration > 0 else None
     try:
-        while True:
-            # Receive packets
-            try:
-                packet, addr = sock.recvfrom(65535)
-            except socket.timeout:
-                packet = None
-
-            if packet:
-                if len(packet) < HEADER_SIZE:
-                    # Malformed; ignore
-                    continue
-                hdr = Header.unpack(packet[:HEADER_SIZE])
-                if hdr.magic != b"VS" or hdr.version != 1:
-                    # Unknown protocol
-                    continue
-
-                payload = packet[HEADER_SIZE:HEADER_SIZE + hdr.payload_size]
-
-                entry = buffers.get(hdr.frame_id)
-                if entry is None:
-                    buffers[hdr.frame_id] = (time.time(), hdr.total_packets, 0, {hdr.packet_idx: payload})
-                else:
-                    start_time, total_packets, received_count, parts = entry
-                    total_packets = max(total_packets, hdr.total_packets)  # be tolerant
-                    if hdr.packet_idx not in parts:
-                        parts[hdr.packet_idx] = payload
-                        received_count += 1
-                    buffers[hdr.frame_id] = (start_time, total_packets, received_count, parts)
-
-                # If we already have all packets, assemble immediately
-                start_time, total_packets, received_count, parts = buffers[hdr.frame_id]
-                if len(parts) == total_packets and (total_packets > 0):
-                    ordered = b"".join(parts[i] for i in range(total_packets) if i in parts)
-                    show_frame(ordered)
-                    # Cleanup old frames
-                    for fid in list(buffers.keys()):
-                        if fid <= hdr.frame_id:
-                            buffers.pop(fid, None)
-                    continue
-
-            # Drop stale/incomplete frames
-            now = time.time()
-            to_delete = []
-            for fid, (start_time, total_packets, received_count, parts) in buffers.items():
-                if now - start_time > args.timeout:
-                    to_delete.append(fid)
-            for fid in to_delete:
-                buffers.pop(fid, None)
-
-            # Keep window size bounded
-            if len(buffers) > args.window:
-                # drop the oldest
-                oldest = min(buffers.keys())
-                buffers.pop(oldest, None)
+        # OpenCV windows belong to the main thread
+        while deadline is None or time.time() < deadline:
+            item = to_display.get(timeout=0.01)
+            if item is not None:
+                frame_id, image = item
+                # Decoders can finish out of order; never step backwards
+                # (but follow a restarted server back to frame 0)
+                if frame_is_newer(frame_id, last_shown):
+                    if not args.headless:
+                        cv2.imshow("UDP Video Client", image)
+                    last_shown = frame_id
+                    shown += 1
 
             # UI key handling
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if not args.headless and cv2.waitKey(1) & 0xFF == ord('q'):
                 break
 
     except KeyboardInterrupt:
         print("\n[CLIENT] Interrupted by user. Exiting.")
     finally:
-        cv2.destroyAllWindows()
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=1.0)
+        if subscription is not None:
+            sock.sendto(control_message(UNSUBSCRIBE), subscription)
+        print(f"[CLIENT] Frames: {frames.stats()}")
+        decoded = [sum(column) for column in zip(*counts)]
+        print(f"[CLIENT] Decoded {decoded[0]} ({decoded[1]} errors), shown {shown}, "
+              f"skipped before decode {to_decode.replaced}, before display {to_display.replaced}, "
+              f"tiled frames dropped on a full queue {tiled_dropped[0]}, "
+              f"deltas discarded after a gap {compositor.skipped}")
+        if args.json:
+            write_json(telemetry.summary(frames, shown, decoded[0]), args.json)
+        if not args.headless:
+            cv2.destroyAllWindows()
         sock.close()
 
-def show_frame(jpeg_bytes: bytes):
-    arr = np.frombuffer(jpeg_bytes, dtype=np.uint8)
-    frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-    if frame is None:
-        return
-    cv2.imshow("UDP Video Client", frame)
+def receive_loop(sock: socket.socket, ring_size: int, frames: ReassemblyManager,
+                 to_decode: LatestQueue, stop: threading.Event,
+                 reporter: FeedbackReporter = None, subscription=None,
+                 telemetry: ClientTelemetry = None, tiled: queue.Queue = None,
+                 tiled_dropped: list = None):
+    # Packets land in a preallocated ring and are copied once, straight
+    # into their frame's reassembly buffer
+    ring = ReceiveRing(ring_size)
+    server = None  # where the stream comes from; receiver reports go there
+    next_subscribe = 0.0
+    while not stop.is_set():
+        if subscription is not None and time.time() >= next_subscribe:
+            # Repeated as a keepalive, well within the server's timeout
+            sock.sendto(control_message(SUBSCRIBE), subscription)
+            next_subscribe = time.time() + 2.0
+
+        try:
+            packet, server = ring.recvfrom_into(sock)
+        except socket.timeout:
+            packet = None
+        except OSError:
+            break
+
+        now = time.time()
+        if packet:
+            frame = frames.on_packet(packet, now)
+            if frame is not None:
+                if reporter is not None:
+                    reporter.on_frame(now)
+                if telemetry is not None:
+                    telemetry.on_frame(frame, now)
+                if tiled is not None and (frame.delta or frame.keyframe):
+                    try:
+                        tiled.put_nowait(frame)
+                    except queue.Full:
+                        # The compositor is behind: the gap in frame ids
+                        # makes it wait for the next keyframe
+                        frames.release(frame)
+                        tiled_dropped[0] += 1
+                else:
+                    skipped = to_decode.put(frame)
+                    if skipped is not None:
+                        frames.release(skipped)
+
+        # Drop stale/incomplete frames (the window is enforced on insert)
+        frames.expire(now)
+        if reporter is not None:
+            reporter.maybe_report(now, server)
+
+    # Recycle a frame nobody will decode
+    frame = to_decode.get(timeout=0)
+    if frame is not None:
+        frames.release(frame)
+
+def decode_loop(frames: ReassemblyManager, to_decode: LatestQueue, to_display: LatestQueue,
+                stop: threading.Event, decoded: list):
+    while not stop.is_set():
+        frame = to_decode.get(timeout=0.1)
+        if frame is None:
+            continue
+        image = decode_frame(frame.view())
+        # imdecode has copied the pixels out, so the buffer can be reused now
+        frames.release(frame)
+        if image is None:
+            decoded[1] += 1
+            continue
+        decoded[0] += 1
+        to_display.put((frame.frame_id, image))
+
+def composite_loop(frames: ReassemblyManager, tiled: queue.Queue, to_display: LatestQueue,
+                   stop: threading.Event, decoded: list, compositor: TileCompositor):
+    # Every keyframe and delta, in completion order; the compositor
+    # discards deltas after a gap until the next keyframe
+    while not stop.is_set():
+        try:
+            frame = tiled.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        skipped = compositor.skipped
+        image = compositor.apply(frame.frame_id, frame.view(), frame.delta)
+        frames.release(frame)
+        if image is None:
+            if compositor.skipped == skipped:
+                decoded[1] += 1  # discarded deltas are counted by the compositor
+            continue
+        decoded[0] += 1
+        to_display.put((frame.frame_id, image))
+
+def decode_frame(jpeg: memoryview):
+    # Zero-copy: the array views the reassembly buffer; cv2.imdecode releases the GIL
+    arr = np.frombuffer(jpeg, dtype=np.uint8)
+    return cv2.imdecode(arr, cv2.IMREAD_COLOR)
 
 if __name__ == "__main__":
     main()
@@ -10,9 +10,58 @@ HEADER_STRUCT = struct.Struct("!2sBBIHHH")
 HEADER_SIZE = HEADER_STRUCT.size  # 14 bytes
 
 FLAG_MARKER = 0x01  # last packet of the frame
+FLAG_PARITY = 0x02  # XOR parity packet (forward error correction), see below
+FLAG_TIMING = 0x04  # send timestamp of the frame, see below
+FLAG_DELTA = 0x08   # the frame is a tiled delta update, see below
+FLAG_KEYFRAME = 0x10  # a full frame of a tiled stream, which later deltas build on
+
+# FEC: with group size K, a frame of N data packets gets G = ceil(N / K)
+# parity packets. Group g holds the data packets idx with idx % G == g, so
+# a burst of up to G consecutive losses costs at most one packet per group.
+# A parity packet has FLAG_PARITY set, packet_idx = g, total_packets = N,
+# and a payload of PARITY_STRUCT (K, XOR of the members' payload sizes)
+# followed by the XOR of the members' payloads, each zero-padded to the
+# data stride. One missing packet per group can be rebuilt from it.
+PARITY_STRUCT = struct.Struct("!HH")
+PARITY_SIZE = PARITY_STRUCT.size  # 4 bytes
+
+# Timing: an optional extra datagram per frame, sent before its data, with
+# FLAG_TIMING set, packet_idx = TIMING_IDX (never a data index) and a
+# payload of TIMING_STRUCT: the send time in microseconds since the epoch.
+TIMING_STRUCT = struct.Struct("!Q")
+TIMING_IDX = 0xFFFF
+
+# Tiled streams: frame ids are consecutive, so a client can tell when a
+# delta is missing. Keyframes are plain JPEG frames with FLAG_KEYFRAME.
+# Delta frames (FLAG_DELTA on every packet): DELTA_STRUCT, then
+# `count` (row, col) uint16 tile coordinates, then one JPEG holding the
+# changed tiles side by side, `columns` tiles per mosaic row.
+# width(H), height(H), tile size(H), count(H), columns(H)
+DELTA_STRUCT = struct.Struct("!HHHHH")
 
 MAX_DATAGRAM = 1400  # conservative to avoid IP fragmentation on most networks
-MAX_PAYLOAD = MAX_DATAGRAM - HEADER_SIZE
+# Leaves room for PARITY_SIZE, so parity packets fit MAX_DATAGRAM as well
+MAX_PAYLOAD = MAX_DATAGRAM - HEADER_SIZE - PARITY_SIZE
+MAX_UDP_PAYLOAD = 65507  # largest datagram UDP over IPv4 can carry
+
+
+# Frame ids are 32-bit and wrap around, so they are compared as serial
+# numbers. An id more than RESTART_GAP behind the last one is taken as a
+# restarted stream (a new server starts again at 0) rather than a late frame.
+RESTART_GAP = 64
+
+
+def frame_is_newer(frame_id: int, last: int) -> bool:
+    """True if `frame_id` comes after `last` (-1 = nothing seen yet)."""
+    if last < 0:
+        return True
+    delta = (frame_id - last) & 0xFFFFFFFF
+    return delta != 0 and delta < (1 << 32) - RESTART_GAP
+
+
+def max_payload_limit(fec: bool) -> int:
+    """Largest payload stride whose datagrams, parity included with FEC, fit UDP."""
+    return MAX_UDP_PAYLOAD - HEADER_SIZE - (PARITY_SIZE if fec else 0)
 
 @dataclass
 class Header:
@@ -34,3 +83,43 @@ class Header:
     def unpack(data: bytes) -> "Header":
         magic, version, flags, frame_id, packet_idx, total_packets, payload_size = HEADER_STRUCT.unpack(data)
         return Header(magic, version, flags, frame_id, packet_idx, total_packets, payload_size)
+
+# Receiver reports (client -> server feedback). Counters are cumulative
+# since the client started, so a lost report costs nothing but freshness.
+REPORT_MAGIC = b"VR"
+# magic(2s), version(B), pad, seq(I), packets_expected(I), packets_received(I),
+# frames_completed(I), frames_lost(I), jitter_us(I)
+REPORT_STRUCT = struct.Struct("!2sBxIIIIII")
+
+@dataclass
+class Report:
+    seq: int = 0
+    packets_expected: int = 0
+    packets_received: int = 0
+    frames_completed: int = 0
+    frames_lost: int = 0
+    jitter_us: int = 0
+
+    def pack(self) -> bytes:
+        return REPORT_STRUCT.pack(
+            REPORT_MAGIC, VERSION, self.seq & 0xFFFFFFFF, self.packets_expected & 0xFFFFFFFF,
+            self.packets_received & 0xFFFFFFFF, self.frames_completed & 0xFFFFFFFF,
+            self.frames_lost & 0xFFFFFFFF, min(self.jitter_us, 0xFFFFFFFF)
+        )
+
+    @staticmethod
+    def unpack(data: bytes) -> "Report":
+        magic, version, *fields = REPORT_STRUCT.unpack(data)
+        if magic != REPORT_MAGIC or version != VERSION:
+            raise ValueError("Not a receiver report")
+        return Report(*fields)
+
+# Subscription control (client -> server). A subscriber repeats SUBSCRIBE
+# as a keepalive; the server forgets subscribers that go quiet.
+CONTROL_MAGIC = b"VC"
+CONTROL_STRUCT = struct.Struct("!2sBB")  # magic(2s), version(B), command(B)
+SUBSCRIBE = 1
+UNSUBSCRIBE = 2
+
+def control_message(command: int) -> bytes:
+    return CONTROL_STRUCT.pack(CONTROL_MAGIC, VERSION, command)
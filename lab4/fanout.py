@@ -0,0 +1,238 @@
+from __future__ import annotations
+import select
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+from adaptive import BitrateController
+from common import (CONTROL_MAGIC, CONTROL_STRUCT, REPORT_MAGIC, REPORT_STRUCT, SUBSCRIBE,
+                    UNSUBSCRIBE, VERSION, MAX_PAYLOAD, Report)
+from sender import FrameSender, best_send_mode
+
+
+class Subscriber:
+    """
+    One viewer: a bounded queue of encoded frames drained by its own
+    sender thread, so a slow or unreachable viewer only loses its own
+    frames. When the queue is full the oldest frame is dropped, and
+    on_drop() is called so a tiled stream can send a fresh keyframe.
+    """
+
+    def __init__(self, sock: socket.socket, address: Tuple[str, int], max_payload: int,
+                 send_mode: str, fec: int, queue_size: int, controller: Optional[BitrateController],
+                 timestamps: bool = False, on_drop: Optional[Callable[[], None]] = None):
+        self.address = address
+        self.on_drop = on_drop
+        self.sender = FrameSender(sock, max_payload, send_mode, fec, timestamps)
+        self.controller = controller
+        self.last_seen = time.time()
+        self.dropped = 0
+        self.sent = 0
+        self._queue = deque(maxlen=queue_size)
+        self._ready = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"send-{address[0]}:{address[1]}",
+                                        daemon=True)
+        self._thread.start()
+
+    def offer(self, frame_id: int, data, flags: int = 0):
+        with self._ready:
+            full = len(self._queue) == self._queue.maxlen
+            if full:
+                self.dropped += 1
+            self._queue.append((frame_id, data, flags))
+            self._ready.notify()
+        if full and self.on_drop is not None:
+            self.on_drop()
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self._queue and not self._closed:
+                    self._ready.wait()
+                if self._closed:
+                    return
+                frame_id, data, flags = self._queue.popleft()
+            try:
+                self.sender.send_frame(frame_id, data, self.address, flags)
+                self.sent += 1
+            except OSError:
+                self.dropped += 1  # e.g. unreachable: keep serving the others
+                if self.on_drop is not None:
+                    self.on_drop()
+
+    def close(self):
+        with self._ready:
+            self._closed = True
+            self._ready.notify()
+        self._thread.join(timeout=1.0)
+
+
+class Fanout:
+    """
+    Serves one encoded stream to many viewers.
+
+    Viewers send SUBSCRIBE datagrams (repeated as a keepalive) and
+    UNSUBSCRIBE to the server's socket. Each encoded frame is handed to
+    every subscriber's queue by reference, so it is encoded once whatever
+    the number of viewers. Subscribers silent for `timeout` seconds are
+    dropped.
+
+    With `adaptive`, every subscriber gets its own BitrateController from
+    its receiver reports, and the shared encoder follows the most
+    constrained one: on_change(quality, scale, fps) gets the minimum of each.
+
+    on_keyframe(), if given, is called whenever a viewer joins or one of
+    its frames is dropped: a tiled stream's deltas are useless to that
+    viewer until the next keyframe. Drops force at most one keyframe per
+    `keyframe_gap` frames sent, so a viewer that keeps dropping cannot
+    turn the whole stream into (larger) keyframes.
+
+    Offers send_frame(frame_id, data, target) like FrameSender, so it
+    plugs into StreamPipeline; the target is ignored.
+    """
+
+    def __init__(self, sock: socket.socket, max_payload: int = MAX_PAYLOAD, send_mode: str = "auto",
+                 fec: int = 0, queue_size: int = 2, timeout: float = 10.0,
+                 adaptive: Optional[Callable[[], BitrateController]] = None,
+                 on_change: Optional[Callable[[int, float, float], None]] = None,
+                 timestamps: bool = False, on_keyframe: Optional[Callable[[], None]] = None,
+                 keyframe_gap: int = 30):
+        self.sock = sock
+        self.max_payload = max_payload
+        self.mode = best_send_mode() if send_mode == "auto" else send_mode
+        self.fec = fec
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.adaptive = adaptive
+        self.on_change = on_change
+        self.timestamps = timestamps
+        self.on_keyframe = on_keyframe
+        self.keyframe_gap = keyframe_gap
+        self.frames = 0
+        self._last_forced = -keyframe_gap  # self.frames at the last forced keyframe
+        self.subscribers: Dict[Tuple[str, int], Subscriber] = {}
+        self._lock = threading.Lock()
+        self._next_expiry = 0.0
+
+    def send_frame(self, frame_id: int, data, target=None, flags: int = 0) -> int:
+        """Queues one encoded frame for every subscriber. Returns how many."""
+        now = time.time()
+        if now >= self._next_expiry:
+            self._expire(now)
+        with self._lock:
+            self.frames += 1
+            subscribers = list(self.subscribers.values())
+        for subscriber in subscribers:
+            subscriber.offer(frame_id, data, flags)
+        return len(subscribers)
+
+    def _subscribe(self, address: Tuple[str, int]):
+        with self._lock:
+            subscriber = self.subscribers.get(address)
+            if subscriber is None:
+                controller = self.adaptive() if self.adaptive else None
+                subscriber = Subscriber(self.sock, address, self.max_payload, self.mode,
+                                        self.fec, self.queue_size, controller, self.timestamps,
+                                        self._on_drop)
+                self.subscribers[address] = subscriber
+                print(f"[SERVER] Subscribed {address[0]}:{address[1]} ({len(self.subscribers)} viewers)")
+                joined = True
+            else:
+                joined = False
+        subscriber.last_seen = time.time()
+        if joined:
+            self._force_keyframe(always=True)
+
+    def _on_drop(self):
+        self._force_keyframe(always=False)
+
+    def _force_keyframe(self, always: bool):
+        if self.on_keyframe is None:
+            return
+        with self._lock:
+            if not always and self.frames - self._last_forced < self.keyframe_gap:
+                return
+            self._last_forced = self.frames
+        self.on_keyframe()
+
+    def _unsubscribe(self, address: Tuple[str, int], reason: str):
+        with self._lock:
+            subscriber = self.subscribers.pop(address, None)
+            remaining = len(self.subscribers)
+        if subscriber is not None:
+            subscriber.close()
+            print(f"[SERVER] {reason} {address[0]}:{address[1]} ({remaining} viewers), "
+                  f"sent {subscriber.sent}, dropped {subscriber.dropped}")
+            self._retune()
+
+    def _expire(self, now: float):
+        self._next_expiry = now + 1.0
+        with self._lock:
+            stale = [a for a, s in self.subscribers.items() if now - s.last_seen > self.timeout]
+        for address in stale:
+            self._unsubscribe(address, "Timed out")
+
+    def _retune(self):
+        if self.on_change is None:
+            return
+        with self._lock:
+            controllers = [s.controller for s in self.subscribers.values() if s.controller]
+        if controllers:
+            self.on_change(min(c.quality for c in controllers), min(c.scale for c in controllers),
+                           min(c.fps for c in controllers))
+
+    def _on_report(self, data: bytes, address: Tuple[str, int]):
+        subscriber = self.subscribers.get(address)
+        if subscriber is None:
+            return
+        subscriber.last_seen = time.time()
+        if subscriber.controller is None:
+            return
+        try:
+            report = Report.unpack(data)
+        except ValueError:
+            return
+        if subscriber.controller.on_report(report, time.time()):
+            self._retune()
+
+    def listen(self, stop: threading.Event):
+        """
+        Handles subscription control messages and receiver reports arriving
+        on the server socket until `stop` is set; meant for a daemon thread.
+        """
+        buf = bytearray(64)
+        while not stop.is_set():
+            # select() rather than a socket timeout, which would make the
+            # socket non-blocking for the senders' sendmmsg
+            try:
+                readable, _, _ = select.select([self.sock], [], [], 0.2)
+                if not readable:
+                    continue
+                nbytes, address = self.sock.recvfrom_into(buf)
+            except (OSError, ValueError):
+                break  # socket closed
+            data = bytes(buf[:nbytes])
+            if nbytes == CONTROL_STRUCT.size and data[:2] == CONTROL_MAGIC:
+                _, version, command = CONTROL_STRUCT.unpack(data)
+                if version != VERSION:
+                    continue
+                if command == SUBSCRIBE:
+                    self._subscribe(address)
+                elif command == UNSUBSCRIBE:
+                    self._unsubscribe(address, "Unsubscribed")
+            elif nbytes == REPORT_STRUCT.size and data[:2] == REPORT_MAGIC:
+                self._on_report(data, address)
+
+    def close(self):
+        with self._lock:
+            subscribers, self.subscribers = self.subscribers, {}
+        for subscriber in subscribers.values():
+            subscriber.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {f"{a[0]}:{a[1]}": {"sent": s.sent, "dropped": s.dropped}
+                    for a, s in self.subscribers.items()}
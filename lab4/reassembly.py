@@ -0,0 +1,397 @@
+from __future__ import annotations
+import math
+import socket
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from common import (HEADER_SIZE, HEADER_STRUCT, MAGIC, VERSION, FLAG_PARITY, FLAG_TIMING, FLAG_DELTA,
+                    FLAG_KEYFRAME, MAX_PAYLOAD, PARITY_STRUCT, PARITY_SIZE, TIMING_STRUCT, frame_is_newer)
+
+MAX_UDP_DATAGRAM = 65535
+MAX_FRAME_BYTES = 16 << 20  # default cap on one frame's reassembly buffer
+
+
+class ReceiveRing:
+    """
+    A fixed ring of preallocated receive buffers.
+    Each recv fills the next slot with recv_into, so receiving never
+    allocates; a returned view stays valid for the next `slots - 1` receives.
+    """
+
+    def __init__(self, slots: int = 64, slot_size: int = MAX_UDP_DATAGRAM):
+        self._views = [memoryview(bytearray(slot_size)) for _ in range(slots)]
+        self._next = 0
+
+    def recv_into(self, sock: socket.socket) -> memoryview:
+        view = self._views[self._next]
+        self._next = (self._next + 1) % len(self._views)
+        nbytes = sock.recv_into(view)
+        return view[:nbytes]
+
+    def recvfrom_into(self, sock: socket.socket):
+        """Like recv_into, also returning the sender's address."""
+        view = self._views[self._next]
+        self._next = (self._next + 1) % len(self._views)
+        nbytes, address = sock.recvfrom_into(view)
+        return view[:nbytes], address
+
+
+class BufferPool:
+    """
+    Recycles frame reassembly buffers so steady-state streaming allocates
+    nothing. Holds at most `limit` idle buffers. Thread-safe, so a buffer
+    can be released by whichever thread finished with it.
+    """
+
+    def __init__(self, limit: int = 64):
+        self.limit = limit
+        self._free: List[bytearray] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int) -> bytearray:
+        with self._lock:
+            free = self._free
+            for i in range(len(free) - 1, -1, -1):
+                if len(free[i]) >= size:
+                    return free.pop(i)
+        return bytearray(size)
+
+    def release(self, buffer: bytearray):
+        with self._lock:
+            if len(self._free) < self.limit:
+                self._free.append(buffer)
+
+
+class FrameAssembly:
+    """
+    In-place reassembly of one frame: payload `idx` is written straight to
+    offset idx * stride of a single buffer, so a finished frame needs no join.
+    Every packet but the last must carry exactly `stride` bytes.
+
+    Parity packets (FEC, see common.py) are kept until their group is
+    missing exactly one data packet, which is then rebuilt in place.
+    """
+    __slots__ = ("frame_id", "total", "stride", "buffer", "received", "count", "length", "start_time",
+                 "groups", "parity", "missing", "recovered", "sent_at", "delta", "keyframe")
+
+    def __init__(self, frame_id: int, total: int, stride: int, buffer: bytearray, start_time: float):
+        self.frame_id = frame_id
+        self.total = total
+        self.stride = stride
+        self.buffer = buffer
+        self.received = bytearray(total)
+        self.count = 0
+        self.length = total * stride  # corrected once the last packet arrives
+        self.start_time = start_time
+        self.groups = 0       # FEC groups, known from the first parity packet
+        self.parity = None    # group -> parity payload
+        self.missing = None   # group -> data packets still missing
+        self.recovered = 0
+        self.sent_at = None   # sender's clock, from a timing packet
+        self.delta = False    # a tiled delta update rather than a full JPEG
+        self.keyframe = False # a full JPEG that a tiled stream's deltas build on
+
+    def add(self, idx: int, payload: memoryview) -> bool:
+        """
+        Copies one payload into place. Returns False for duplicates and
+        packets that do not fit the frame's layout.
+        """
+        if idx >= self.total or self.received[idx]:
+            return False
+        size = len(payload)
+        if idx == self.total - 1:
+            if size > self.stride:
+                return False
+            self.length = idx * self.stride + size
+        elif size != self.stride:
+            return False
+        offset = idx * self.stride
+        self.buffer[offset:offset + size] = payload
+        self.received[idx] = 1
+        self.count += 1
+        if self.groups:
+            group = idx % self.groups
+            self.missing[group] -= 1
+            if self.missing[group] == 1 and group in self.parity:
+                self._recover(group)
+        return True
+
+    def add_parity(self, group: int, payload: memoryview) -> bool:
+        """
+        Stores one parity payload (group size and size XOR prefix included).
+        Returns False for duplicates and parity that does not fit the frame.
+        """
+        if len(payload) != PARITY_SIZE + self.stride:
+            return False
+        k, _ = PARITY_STRUCT.unpack_from(payload)
+        if k == 0:
+            return False
+        if not self.groups:
+            self.groups = (self.total + k - 1) // k
+            self.parity = {}
+            groups = self.groups
+            self.missing = [self.received[g::groups].count(0) for g in range(groups)]
+        if group >= self.groups or group in self.parity:
+            return False
+        if self.missing[group] == 0:
+            return True  # nothing left to rebuild
+        self.parity[group] = bytes(payload)
+        if self.missing[group] == 1:
+            self._recover(group)
+        return True
+
+    def _recover(self, group: int):
+        """Rebuilds the one missing data packet of `group` from its parity."""
+        parity = self.parity.pop(group)
+        stride, total, groups = self.stride, self.total, self.groups
+        members = np.frombuffer(self.buffer, dtype=np.uint8, count=total * stride).reshape(total, stride)
+        present = np.frombuffer(self.received, dtype=np.uint8)[group::groups].astype(bool)
+        indices = np.arange(group, total, groups)
+        lost = int(indices[~present][0])
+
+        data = np.frombuffer(parity, dtype=np.uint8, offset=PARITY_SIZE).copy()
+        _, size = PARITY_STRUCT.unpack_from(parity)
+        last = total - 1
+        for idx in indices[present].tolist():
+            if idx == last:
+                # Only the valid bytes: the rest of the row is stale pool memory
+                tail = self.length - last * stride
+                data[:tail] ^= members[last, :tail]
+                size ^= tail
+            else:
+                data ^= members[idx]
+                size ^= stride
+        if size > stride or (lost != last and size != stride):
+            return  # inconsistent parity: leave the frame to time out
+        self.recovered += 1
+        self.add(lost, memoryview(data)[:size])
+
+    @property
+    def complete(self) -> bool:
+        return self.count == self.total
+
+    def view(self) -> memoryview:
+        """Zero-copy view of the reassembled frame."""
+        return memoryview(self.buffer)[:self.length]
+
+    @classmethod
+    def start(cls, frame_id: int, total: int, pool: BufferPool, start_time: float,
+              stride: int = MAX_PAYLOAD) -> "FrameAssembly":
+        return cls(frame_id, total, stride, pool.acquire(total * stride), start_time)
+
+
+class LatestQueue:
+    """
+    A one-slot hand-off between threads where the newest item wins: put()
+    replaces an item nobody has taken yet and returns it, so a slow
+    consumer always gets the most recent frame instead of a backlog.
+    """
+
+    def __init__(self):
+        self._item = None
+        self._ready = threading.Condition()
+        self.replaced = 0
+
+    def put(self, item):
+        """Stores `item` and returns the item it replaced, if any."""
+        with self._ready:
+            old, self._item = self._item, item
+            if old is not None:
+                self.replaced += 1
+            self._ready.notify()
+        return old
+
+    def get(self, timeout: Optional[float] = None):
+        """Takes the newest item; None if nothing arrives within `timeout`."""
+        with self._ready:
+            if self._item is None:
+                self._ready.wait(timeout)
+            item, self._item = self._item, None
+        return item
+
+
+class TimerWheel:
+    """
+    A hashed timing wheel. schedule() is O(1); advance() does work
+    proportional to the ticks that passed plus the timers that fire, never
+    to the number of pending timers.
+    """
+
+    def __init__(self, tick: float = 0.01, slots: int = 512):
+        self.tick = tick
+        self._slots: List[list] = [[] for _ in range(slots)]
+        self._current = None  # last tick processed
+
+    def schedule(self, item, deadline: float):
+        due = math.ceil(deadline / self.tick)
+        if self._current is not None and due <= self._current:
+            due = self._current + 1
+        self._slots[due % len(self._slots)].append((due, item))
+
+    def advance(self, now: float) -> list:
+        """Returns the items whose deadline is at or before `now`."""
+        target = int(now / self.tick)
+        if self._current is None:
+            # First call: check every slot once for timers scheduled before it
+            self._current = target - len(self._slots)
+        fired = []
+        slots = self._slots
+        # A long gap only needs one pass over the wheel
+        start = max(self._current + 1, target - len(slots) + 1)
+        for tick in range(start, target + 1):
+            slot = slots[tick % len(slots)]
+            if not slot:
+                continue
+            pending = []
+            for entry in slot:
+                if entry[0] <= target:
+                    fired.append(entry[1])
+                else:
+                    pending.append(entry)
+            slots[tick % len(slots)] = pending
+        self._current = max(self._current, target)
+        return fired
+
+
+class ReassemblyManager:
+    """
+    Tracks the frames being reassembled with amortized O(1) work per packet.
+
+    Frames sit in an OrderedDict in order of their first packet, so the
+    oldest frame for window eviction is always at the front, and each frame's
+    timeout is a timer on a TimerWheel instead of a scan over all frames.
+    When a frame completes, older frames still waiting at the front are
+    dropped as superseded.
+
+    A frame's buffer is sized from the header's total_packets, so frames
+    that would need more than `max_frame` bytes are rejected before
+    anything is allocated.
+    """
+
+    def __init__(self, timeout: float = 2.0, window: int = 50, stride: int = MAX_PAYLOAD,
+                 tick: float = 0.01, max_frame: int = MAX_FRAME_BYTES):
+        self.timeout = timeout
+        self.window = window
+        self.stride = stride
+        self.max_packets = max(1, max_frame // stride)
+        self.pool = BufferPool(window + 1)
+        self.frames: "OrderedDict[int, FrameAssembly]" = OrderedDict()
+        # Recently completed or dropped frame ids, so their late, duplicate
+        # or parity packets do not start the frame all over again
+        self.retired: "OrderedDict[int, None]" = OrderedDict()
+        self.retired_limit = max(64, 2 * window)
+        self.wheel = TimerWheel(tick, max(64, int(timeout / tick) + 2))
+
+        # Counters
+        self.completed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.superseded = 0
+        self.rejected = 0
+        self.recovered = 0  # data packets rebuilt from parity
+        self.packets_expected = 0  # data packets of every frame seen
+        self.packets_received = 0  # distinct data packets that arrived
+
+    def _retire(self, frame_id: int):
+        self.retired[frame_id] = None
+        if len(self.retired) > self.retired_limit:
+            self.retired.popitem(last=False)
+
+    def _drop(self, frame: FrameAssembly):
+        del self.frames[frame.frame_id]
+        self._retire(frame.frame_id)
+        self.pool.release(frame.buffer)
+
+    def on_packet(self, packet: memoryview, now: float) -> Optional[FrameAssembly]:
+        """
+        Handles one datagram. Returns the frame it completed, if any; pass
+        that frame to release() once done with its view.
+        """
+        if len(packet) < HEADER_SIZE:
+            self.rejected += 1
+            return None
+        magic, version, flags, frame_id, packet_idx, total_packets, payload_size = \
+            HEADER_STRUCT.unpack_from(packet)
+        if magic != MAGIC or version != VERSION or not 0 < total_packets <= self.max_packets \
+                or HEADER_SIZE + payload_size > len(packet):
+            self.rejected += 1
+            return None
+
+        frames = self.frames
+        frame = frames.get(frame_id)
+        if frame is None:
+            if frame_id in self.retired:
+                return None
+            frame = FrameAssembly.start(frame_id, total_packets, self.pool, now, self.stride)
+            frames[frame_id] = frame
+            self.packets_expected += total_packets
+            self.wheel.schedule(frame, now + self.timeout)
+            if len(frames) > self.window:
+                self._drop(next(iter(frames.values())))
+                self.evicted += 1
+        elif frame.total != total_packets:
+            self.rejected += 1
+            return None
+
+        payload = packet[HEADER_SIZE:HEADER_SIZE + payload_size]
+        if flags & FLAG_TIMING:
+            if payload_size == TIMING_STRUCT.size:
+                frame.sent_at = TIMING_STRUCT.unpack(payload)[0] / 1e6
+            return None
+        if flags & FLAG_PARITY:
+            if not frame.add_parity(packet_idx, payload):
+                return None
+        elif frame.add(packet_idx, payload):
+            self.packets_received += 1
+        else:
+            return None
+        if flags & FLAG_DELTA:
+            frame.delta = True
+        elif flags & FLAG_KEYFRAME:
+            frame.keyframe = True
+        if not frame.complete:
+            return None
+
+        del frames[frame_id]
+        self.completed += 1
+        self.recovered += frame.recovered
+        self._retire(frame_id)
+        # Frames that started before this one and are still incomplete are stale
+        while frames:
+            oldest = next(iter(frames.values()))
+            if not frame_is_newer(frame_id, oldest.frame_id):
+                break
+            self._drop(oldest)
+            self.superseded += 1
+        return frame
+
+    def release(self, frame: FrameAssembly):
+        """Returns a completed frame's buffer to the pool."""
+        self.pool.release(frame.buffer)
+
+    def expire(self, now: float) -> int:
+        """Drops frames older than the timeout. Returns how many."""
+        count = 0
+        for frame in self.wheel.advance(now):
+            # Timers of frames that completed or were dropped are skipped
+            if self.frames.get(frame.frame_id) is frame:
+                self._drop(frame)
+                count += 1
+        self.expired += count
+        return count
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.frames),
+            "completed": self.completed,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "superseded": self.superseded,
+            "rejected": self.rejected,
+            "recovered": self.recovered,
+            "packets_expected": self.packets_expected,
+            "packets_received": self.packets_received,
+        }
@@ -0,0 +1,274 @@
+from __future__ import annotations
+import ctypes
+import errno
+import os
+import socket
+import sys
+import time
+from typing import Tuple
+
+import numpy as np
+
+from common import (HEADER_SIZE, HEADER_STRUCT, MAGIC, VERSION, FLAG_MARKER, FLAG_PARITY, FLAG_TIMING,
+                    MAX_PAYLOAD, PARITY_STRUCT, PARITY_SIZE, TIMING_STRUCT, TIMING_IDX, max_payload_limit)
+
+# --- sendmmsg(2) through ctypes (Linux) ---
+# Lets one syscall send a whole frame's datagrams. Each message is a
+# two-entry iovec (header slot, payload slice) so nothing is copied in Python.
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+class _SockAddrIn(ctypes.Structure):
+    _fields_ = [
+        ("sin_family", ctypes.c_ushort),
+        ("sin_port", ctypes.c_uint16),   # network byte order
+        ("sin_addr", ctypes.c_uint8 * 4),
+        ("sin_zero", ctypes.c_uint8 * 8),
+    ]
+
+def _load_sendmmsg():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        func = ctypes.CDLL(None, use_errno=True).sendmmsg
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    func.restype = ctypes.c_int
+    return func
+
+_sendmmsg = _load_sendmmsg()
+
+SEND_MODES = ("auto", "sendmmsg", "sendmsg", "sendto")
+
+def best_send_mode() -> str:
+    """Fastest mode this platform supports."""
+    if _sendmmsg is not None:
+        return "sendmmsg"
+    if hasattr(socket.socket, "sendmsg"):
+        return "sendmsg"
+    return "sendto"
+
+
+class FrameSender:
+    """
+    Packetizes encoded frames and sends them without intermediate copies.
+
+    Payloads are memoryview slices of the encoded buffer and headers are
+    packed with HEADER_STRUCT.pack_into into one preallocated buffer that
+    is reused for every frame. Modes:
+      sendmmsg - all datagrams of a frame in as few syscalls as possible (Linux, IPv4)
+      sendmsg  - one scatter/gather syscall per datagram
+      sendto   - header and payload copied into one reused datagram buffer
+
+    With `fec` = K > 0, every frame also gets one XOR parity packet per K
+    data packets (see common.py), sent after the data packets. With
+    `timestamps`, a timing datagram carrying the send time goes first.
+    """
+
+    def __init__(self, sock: socket.socket, max_payload: int = MAX_PAYLOAD, mode: str = "auto",
+                 fec: int = 0, timestamps: bool = False):
+        if mode == "auto":
+            mode = best_send_mode()
+        if mode == "sendmmsg" and _sendmmsg is None:
+            raise ValueError("sendmmsg is not available on this platform")
+        if mode not in SEND_MODES:
+            raise ValueError(f"Unknown send mode: {mode}")
+        if not 0 < max_payload <= max_payload_limit(bool(fec)):
+            raise ValueError(f"max_payload must be 1-{max_payload_limit(bool(fec))} bytes"
+                             f"{' with FEC' if fec else ''}")
+        self.sock = sock
+        self.max_payload = max_payload
+        self.mode = mode
+        self.fec = fec
+        self.timestamps = timestamps
+        self._timing = bytearray(HEADER_SIZE + TIMING_STRUCT.size)
+        self.packets_sent = 0
+        self._capacity = 0
+        self._datagram = bytearray(HEADER_SIZE + PARITY_SIZE + max_payload)
+        self._fec_rows = 0
+        self._addresses = {}
+        self._grow(64)
+
+    def _grow(self, packets: int):
+        """Reallocates the header slots (and sendmmsg arrays) for `packets` datagrams."""
+        self._capacity = packets
+        self._headers = bytearray(HEADER_SIZE * packets)
+        self._header_views = [
+            memoryview(self._headers)[i * HEADER_SIZE:(i + 1) * HEADER_SIZE] for i in range(packets)
+        ]
+        if self.mode == "sendmmsg":
+            self._headers_c = (ctypes.c_char * len(self._headers)).from_buffer(self._headers)
+            self._iov = (_IoVec * (2 * packets))()
+            self._msgs = (_MMsgHdr * packets)()
+            for i in range(packets):
+                self._iov[2 * i].iov_base = ctypes.addressof(self._headers_c) + i * HEADER_SIZE
+                self._iov[2 * i].iov_len = HEADER_SIZE
+                hdr = self._msgs[i].msg_hdr
+                hdr.msg_iov = ctypes.pointer(self._iov[2 * i])
+                hdr.msg_iovlen = 2
+            # Row i = (header base, header len, payload base, payload len), so the
+            # payload iovecs of a whole frame are filled with two vector stores
+            self._iov_table = np.frombuffer(self._iov, dtype=np.uintp).reshape(packets, 4)
+            self._offsets = np.arange(packets, dtype=np.uintp) * self.max_payload
+            self._msg_target = None
+
+    def _parity(self, array: np.ndarray, size: int, total: int) -> int:
+        """
+        Computes the parity payloads of a frame into self._parity_rows and
+        returns how many there are.
+        """
+        k = self.fec
+        stride = self.max_payload
+        groups = (total + k - 1) // k
+        if k * groups > self._fec_rows:
+            self._fec_rows = k * groups
+            self._fec_pad = np.empty(self._fec_rows * stride, dtype=np.uint8)
+            self._parity_rows = np.empty((self._fec_rows, PARITY_SIZE + stride), dtype=np.uint8)
+
+        # Data packet idx is row (idx // groups, idx % groups): XOR down the first axis
+        pad = self._fec_pad[:k * groups * stride]
+        pad[:size] = array
+        pad[size:] = 0
+        rows = self._parity_rows[:groups]
+        np.bitwise_xor.reduce(pad.reshape(k, groups, stride), axis=0, out=rows[:, PARITY_SIZE:])
+
+        # XOR of the members' sizes: `stride` for every full packet, and the
+        # short last packet in its own group
+        last = total - 1
+        last_size = size - last * stride
+        for g in range(groups):
+            members = (total - g + groups - 1) // groups
+            if g == last % groups:
+                sizes = (stride if (members - 1) & 1 else 0) ^ last_size
+            else:
+                sizes = stride if members & 1 else 0
+            PARITY_STRUCT.pack_into(rows[g], 0, k, sizes)
+        return groups
+
+    def _sockaddr(self, target: Tuple[str, int]) -> _SockAddrIn:
+        """Resolved sockaddr_in for an IPv4 target, cached."""
+        addr = self._addresses.get(target)
+        if addr is None:
+            host, port = target
+            packed = socket.inet_aton(socket.gethostbyname(host))
+            addr = _SockAddrIn(socket.AF_INET, socket.htons(port), (ctypes.c_uint8 * 4)(*packed))
+            self._addresses[target] = addr
+        return addr
+
+    def send_frame(self, frame_id: int, data, target: Tuple[str, int], flags: int = 0) -> int:
+        """
+        Sends one encoded frame (bytes, bytearray or a uint8 NumPy array)
+        to `target`. `flags` are added to every packet of the frame. Returns the
+        number of datagrams sent, parity included.
+        """
+        array = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.reshape(-1)
+        view = memoryview(array)
+        size = len(view)
+        max_payload = self.max_payload
+        total = (size + max_payload - 1) // max_payload
+        if total == 0:
+            return 0
+        parity = self._parity(array, size, total) if self.fec else 0
+        count = total + parity
+        if count > self._capacity:
+            self._grow(max(count, 2 * self._capacity))
+
+        headers = self._headers
+        frame_id &= 0xFFFFFFFF
+        if self.timestamps:
+            self._send_timing(frame_id, total, target)
+        for idx in range(total):
+            offset = idx * max_payload
+            HEADER_STRUCT.pack_into(
+                headers, idx * HEADER_SIZE,
+                MAGIC, VERSION, (flags | FLAG_MARKER) if idx == total - 1 else flags,
+                frame_id, idx, total, min(max_payload, size - offset),
+            )
+        for g in range(parity):
+            HEADER_STRUCT.pack_into(
+                headers, (total + g) * HEADER_SIZE,
+                MAGIC, VERSION, flags | FLAG_PARITY, frame_id, g, total, PARITY_SIZE + max_payload,
+            )
+
+        if self.mode == "sendmmsg":
+            self._send_mmsg(array, size, total, parity, target)
+            self.packets_sent += count
+            return count
+
+        payloads = [view[offset:offset + max_payload] for offset in range(0, size, max_payload)]
+        if parity:
+            payloads += [memoryview(row) for row in self._parity_rows[:parity]]
+        if self.mode == "sendmsg":
+            sendmsg = self.sock.sendmsg
+            header_views = self._header_views
+            for idx, payload in enumerate(payloads):
+                sendmsg([header_views[idx], payload], (), 0, target)
+        else:
+            datagram = self._datagram
+            sendto = self.sock.sendto
+            for idx, payload in enumerate(payloads):
+                datagram[:HEADER_SIZE] = self._header_views[idx]
+                datagram[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+                sendto(memoryview(datagram)[:HEADER_SIZE + len(payload)], target)
+
+        self.packets_sent += count
+        return count
+
+    def _send_timing(self, frame_id: int, total: int, target: Tuple[str, int]):
+        timing = self._timing
+        HEADER_STRUCT.pack_into(timing, 0, MAGIC, VERSION, FLAG_TIMING, frame_id, TIMING_IDX, total,
+                                TIMING_STRUCT.size)
+        TIMING_STRUCT.pack_into(timing, HEADER_SIZE, int(time.time() * 1e6))
+        self.sock.sendto(timing, target)
+        self.packets_sent += 1
+
+    def _send_mmsg(self, array: np.ndarray, size: int, total: int, parity: int,
+                   target: Tuple[str, int]):
+        msgs = self._msgs
+        if target != self._msg_target:
+            addr = self._sockaddr(target)
+            for idx in range(self._capacity):
+                hdr = msgs[idx].msg_hdr
+                hdr.msg_name = ctypes.addressof(addr)
+                hdr.msg_namelen = ctypes.sizeof(addr)
+            self._msg_target = target
+
+        table = self._iov_table
+        table[:total, 2] = self._offsets[:total] + array.ctypes.data
+        table[:total, 3] = self.max_payload
+        table[total - 1, 3] = size - (total - 1) * self.max_payload
+        if parity:
+            rows = self._parity_rows
+            table[total:total + parity, 2] = (np.arange(parity, dtype=np.uintp) * rows.shape[1]
+                                              + rows.ctypes.data)
+            table[total:total + parity, 3] = rows.shape[1]
+        total += parity
+
+        fd = self.sock.fileno()
+        first = ctypes.addressof(msgs)
+        sent = 0
+        while sent < total:
+            # The kernel sends at most UIO_MAXIOV messages per call
+            count = _sendmmsg(fd, first + sent * ctypes.sizeof(_MMsgHdr), total - sent, 0)
+            if count < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                raise OSError(err, os.strerror(err))
+            sent += count
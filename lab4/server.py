@@ -1,44 +1,103 @@
 from __future__ import annotations
 import argparse
+import os
 import socket
+import threading
 import time
 from typing import Tuple, Union
 
 import cv2
-import numpy as np
 
-from common import Header, FLAG_MARKER, MAX_PAYLOAD
-
-def split_bytes(data: bytes, chunk_size: int):
-    for i in range(0, len(data), chunk_size):
-        yield data[i:i+chunk_size]
+from adaptive import BitrateController, listen_for_reports
+from common import MAX_PAYLOAD, max_payload_limit
+from fanout import Fanout
+from sender import FrameSender, SEND_MODES
+from stages import StreamPipeline
+from telemetry import SyntheticSource, server_summary, write_json
+from tiles import TileDiffer
 
 def main():
     parser = argparse.ArgumentParser(description="UDP Video Streaming Server")
-    parser.add_argument("--video", required=True, help="Path to video file, RTSP URL, or webcam index (int). Example: 0")
+    parser.add_argument("--video", help="Path to video file, RTSP URL, or webcam index (int). Example: 0")
+    parser.add_argument("--synthetic", metavar="WxH", help="Send generated WxH frames instead of --video")
+    parser.add_argument("--count", type=int, default=0, help="Synthetic frames to send (0 = until interrupted)")
+    parser.add_argument("--pre-encoded", action="store_true",
+                        help="Encode a few synthetic frames up front and cycle them (measures transport only)")
+    parser.add_argument("--timestamps", action="store_true",
+                        help="Send each frame's send time so the client can measure end-to-end latency")
+    parser.add_argument("--json", metavar="PATH", help="Write a JSON summary of the run on exit ('-' = stdout)")
     parser.add_argument("--host", default="127.0.0.1", help="Client IP address to send packets to")
     parser.add_argument("--port", type=int, default=5000, help="Client UDP port")
+    parser.add_argument("--listen-port", type=int, default=0,
+                        help="Serve every client that subscribes on this UDP port instead of --host/--port")
+    parser.add_argument("--queue", type=int, default=2, help="Frames queued per subscriber before the oldest is dropped")
+    parser.add_argument("--multicast", help="Send to this multicast group (on --port) instead of --host")
+    parser.add_argument("--ttl", type=int, default=1, help="Multicast TTL")
     parser.add_argument("--jpeg-quality", type=int, default=70, help="JPEG quality 1-100")
     parser.add_argument("--scale", type=float, default=1.0, help="Resize factor for frames (e.g., 0.5)")
     parser.add_argument("--fps", type=float, default=0.0, help="Override FPS pacing (0 = derive from video)")
     parser.add_argument("--max-payload", type=int, default=MAX_PAYLOAD, help="Max payload bytes per UDP packet")
+    parser.add_argument("--send-mode", choices=SEND_MODES, default="auto",
+                        help="Datagram send path (auto = sendmmsg where available)")
+    parser.add_argument("--fec", type=int, default=0,
+                        help="Send one XOR parity packet per this many data packets (0 = off)")
+    parser.add_argument("--encoders", type=int, default=min(4, os.cpu_count() or 1),
+                        help="JPEG encoder threads")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds from capture to send; later frames are dropped (0 = one interval per encoder + 1)")
+    parser.add_argument("--tiles", type=int, default=0,
+                        help="Send only changed SIZExSIZE tiles between keyframes (multiple of 16, 0 = off)")
+    parser.add_argument("--tile-threshold", type=float, default=2.0,
+                        help="Mean absolute pixel difference above which a tile is resent")
+    parser.add_argument("--keyframe-interval", type=int, default=30,
+                        help="Frames between full keyframes in --tiles mode")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Adapt quality, scale and FPS to the client's receiver reports")
+    parser.add_argument("--min-quality", type=int, default=25, help="Lowest JPEG quality in adaptive mode")
+    parser.add_argument("--abr-log", help="Append every adaptive-mode decision to this file as JSON lines")
 
     args = parser.parse_args()
+    if not args.video and not args.synthetic:
+        parser.error("one of --video or --synthetic is required")
+    limit = max_payload_limit(bool(args.fec))
+    if not 0 < args.max_payload <= limit:
+        parser.error(f"--max-payload must be 1-{limit}{' with --fec' if args.fec else ''}")
+    if args.tiles % 16:
+        parser.error("--tiles must be a multiple of 16")
+    if args.multicast and args.listen_port:
+        parser.error("--multicast already reaches every viewer; it cannot be combined with --listen-port")
+    if args.multicast and args.adaptive:
+        # Every viewer reports to the same socket; one controller would follow whoever reported last
+        parser.error("--adaptive needs per-viewer reports; use --listen-port instead of --multicast")
 
     # Prepare socket
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     target: Tuple[str, int] = (args.host, args.port)
+    if args.multicast:
+        target = (args.multicast, args.port)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, args.ttl)
+    if args.listen_port:
+        # Fan-out: encode once, send to every subscriber
+        sock.bind(("0.0.0.0", args.listen_port))
+        sender = Fanout(sock, args.max_payload, args.send_mode, args.fec, args.queue,
+                        timestamps=args.timestamps, keyframe_gap=args.keyframe_interval)
+    else:
+        sender = FrameSender(sock, args.max_payload, args.send_mode, args.fec, args.timestamps)
 
     # Open video source
-    src: Union[int, str]
-    try:
-        src = int(args.video)
-    except ValueError:
-        src = args.video
+    if args.synthetic:
+        width, height = (int(v) for v in args.synthetic.lower().split("x"))
+        cap = SyntheticSource(width, height, args.count, args.pre_encoded, args.jpeg_quality)
+    else:
+        src: Union[int, str]
+        try:
+            src = int(args.video)
+        except ValueError:
+            src = args.video
 
-    cap = cv2.VideoCapture(src)
-    if not cap.isOpened():
-        raise RuntimeError(f"Failed to open video source: {args.video}")
+        cap = cv2.VideoCapture(src)
+        if not cap.isOpened():
+            raise RuntimeError(f"Failed to open video source: {args.video}")
 
     if args.fps > 0:
         fps = args.fps
@@ -46,7 +105,6 @@ def main():
         fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
         if fps <= 1e-3:
             fps = 25.0
-    frame_interval = 1.0 / float(fps)
 
     encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), int(args.jpeg-quality) if hasattr(args, 'jpeg-quality') else int(args.jpeg_quality)]
     # The above is a defensive workaround in case argparse normalizes `jpeg-quality` to `jpeg_quality`
@@ -54,52 +112,48 @@ def main():
     # Fix parameter handling properly
     encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), int(args.jpeg_quality)]
 
-    frame_id = 0
-    print(f"[SERVER] Streaming to {target} at ~{fps:.2f} FPS, payload {args.max_payload} bytes")
-
+    tiles = TileDiffer(args.tiles, args.tile_threshold, args.keyframe_interval) if args.tiles else None
+    pipeline = StreamPipeline(cap, sender, target, fps, encode_param, args.scale,
+                              args.encoders, latency=args.latency, tiles=tiles)
+    destination = f"subscribers of port {args.listen_port}" if args.listen_port else target
+    print(f"[SERVER] Streaming to {destination} at ~{fps:.2f} FPS, payload {args.max_payload} bytes, "
+          f"{sender.mode}, {pipeline.encoders} encoders")
+
+    stop = threading.Event()
+    abr_log = None
+    if args.adaptive:
+        abr_log = open(args.abr_log, "a") if args.abr_log else None
+        new_controller = lambda: BitrateController(args.jpeg_quality, args.scale, fps,
+                                                   min_quality=args.min_quality, log=abr_log)
+    if args.listen_port:
+        if tiles is not None:
+            sender.on_keyframe = tiles.force_keyframe
+        if args.adaptive:
+            sender.adaptive = new_controller
+            sender.on_change = pipeline.adjust
+        threading.Thread(target=sender.listen, args=(stop,), name="control", daemon=True).start()
+    elif args.adaptive:
+        on_change = lambda c: pipeline.adjust(c.quality, c.scale, c.fps)
+        threading.Thread(target=listen_for_reports, args=(sock, new_controller(), on_change, stop),
+                         name="feedback", daemon=True).start()
+
+    started = time.perf_counter()
     try:
-        while True:
-            t0 = time.time()
-            ok, frame = cap.read()
-            if not ok:
-                print("[SERVER] End of stream or read error. Stopping.")
-                break
-
-            if args.scale and args.scale != 1.0:
-                frame = cv2.resize(frame, None, fx=args.scale, fy=args.scale, interpolation=cv2.INTER_AREA)
-
-            # Encode to JPEG
-            ok, buf = cv2.imencode(".jpg", frame, encode_param)
-            if not ok:
-                print("[SERVER] JPEG encode failed, skipping frame")
-                continue
-
-            data = buf.tobytes()
-            chunks = list(split_bytes(data, args.max_payload))
-            total = len(chunks)
-
-            for idx, payload in enumerate(chunks):
-                flags = FLAG_MARKER if (idx == total - 1) else 0
-                header = Header(
-                    flags=flags,
-                    frame_id=frame_id,
-                    packet_idx=idx,
-                    total_packets=total,
-                    payload_size=len(payload),
-                ).pack()
-                sock.sendto(header + payload, target)
-
-            frame_id += 1
-
-            # Pace to FPS
-            elapsed = time.time() - t0
-            to_sleep = frame_interval - elapsed
-            if to_sleep > 0:
-                time.sleep(to_sleep)
+        pipeline.run()
 
     except KeyboardInterrupt:
         print("\n[SERVER] Interrupted by user. Exiting.")
     finally:
+        pipeline.stop()
+        stop.set()
+        print(f"[SERVER] Frames: {pipeline.stats()}")
+        if args.json:
+            write_json(server_summary(pipeline, sender, started), args.json)
+        if args.listen_port:
+            print(f"[SERVER] Subscribers: {sender.stats()}")
+            sender.close()
+        if abr_log is not None:
+            abr_log.close()
         cap.release()
         sock.close()
 
@@ -0,0 +1,222 @@
+from __future__ import annotations
+import queue
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+
+from common import FLAG_DELTA, FLAG_KEYFRAME
+from sender import FrameSender
+from telemetry import PreEncoded
+from tiles import TileDiffer, encode_delta
+
+_STOP = None  # end-of-stream marker on the encode queue
+
+
+class StreamPipeline:
+    """
+    Capture -> encode -> send as concurrent stages joined by bounded queues.
+
+    - One capture thread reads the source at the target frame rate and
+      numbers the frames. When every encoder is busy and the encode queue
+      is full, the new frame is dropped instead of delaying capture.
+    - A pool of encoder threads resizes and JPEG-encodes frames. OpenCV
+      releases the GIL inside cv2.resize and cv2.imencode, so threads
+      encode on separate cores without a process per worker.
+    - The sender (run() in the calling thread) puts encoded frames back in
+      capture order and sends frame n at capture_time(n) + latency, so
+      output stays evenly paced even though encoders finish out of order.
+      A frame ready more than one frame interval after its slot is
+      dropped, so a slow encoder costs frames rather than ever-growing delay.
+
+    With `tiles`, capture also scales each frame and runs the TileDiffer in
+    order: unchanged frames are skipped, and encoders send keyframes or
+    tiled deltas. Dropping any planned frame forces the next keyframe.
+    """
+
+    def __init__(self, cap, sender: FrameSender, target: Tuple[str, int], fps: float,
+                 encode_param: list, scale: float = 1.0, encoders: int = 4,
+                 queue_size: int = 0, latency: float = 0.0, tiles: Optional[TileDiffer] = None):
+        self.cap = cap
+        self.sender = sender
+        self.target = target
+        self.interval = 1.0 / fps
+        self.encode_param = encode_param
+        self.scale = scale
+        self.encoders = max(1, encoders)
+        self.tiles = tiles
+        # Frames waiting for an encoder; more only adds latency
+        self.queue_size = queue_size or self.encoders
+        # Default budget: one frame interval per encoder in flight, plus one
+        self.latency = latency or (self.encoders + 1) * self.interval
+
+        self._frames: "queue.Queue" = queue.Queue(self.queue_size)
+        self._done = {}                   # frame number -> (capture time, JPEG or None, flags)
+        self._ready = threading.Condition()
+        self._captured = 0                # frames handed to the encoders
+        self._capture_finished = False
+        self._running = threading.Event()
+
+        # Counters
+        self.capture_dropped = 0
+        self.encode_failed = 0
+        self.late_dropped = 0
+        self.sent = 0
+        self.bytes_sent = 0
+        self.unchanged_skipped = 0
+
+    def adjust(self, quality: int, scale: float, fps: float):
+        """Changes the encoding settings and frame rate of frames captured from now on."""
+        self.encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)]
+        self.scale = scale
+        self.interval = 1.0 / fps
+
+    def _capture(self):
+        next_read = time.perf_counter()
+        try:
+            while self._running.is_set():
+                ok, frame = self.cap.read()
+                if not ok:
+                    print("[SERVER] End of stream or read error. Stopping.")
+                    break
+                now = time.perf_counter()
+                if self.tiles is not None and not isinstance(frame, PreEncoded):
+                    frame = self._plan(frame)
+                if frame is None:
+                    self.unchanged_skipped += 1
+                else:
+                    try:
+                        self._frames.put_nowait((self._captured, now, frame))
+                        self._captured += 1
+                    except queue.Full:
+                        self.capture_dropped += 1
+                        if self.tiles is not None:
+                            self.tiles.force_keyframe()
+
+                # Pace file sources; a live camera already blocks in read()
+                interval = self.interval
+                next_read += interval
+                delay = next_read - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -interval:
+                    next_read = time.perf_counter()  # fell behind: don't burst to catch up
+        finally:
+            with self._ready:
+                self._capture_finished = True
+                self._ready.notify_all()
+            for _ in range(self.encoders):
+                self._frames.put(_STOP)
+
+    def _plan(self, frame):
+        """Scales a frame and asks the TileDiffer what to send of it."""
+        scale = self.scale
+        if scale and scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return self.tiles.plan(frame)
+
+    def _encode(self):
+        while True:
+            item = self._frames.get()
+            if item is _STOP:
+                return
+            number, captured_at, frame = item
+            flags = 0
+            try:
+                ok, buf, flags = self._encode_one(frame)
+            except Exception:
+                ok = False  # e.g. an OpenCV error on an odd frame
+            with self._ready:
+                # Failed frames are still posted so the sender never waits on a gap
+                self._done[number] = (captured_at, buf if ok else None, flags)
+                self._ready.notify_all()
+
+    def _encode_one(self, frame) -> tuple:
+        """Encodes one frame or plan. Returns (ok, buffer, flags)."""
+        if isinstance(frame, PreEncoded):
+            return True, frame.data, 0
+        if isinstance(frame, tuple):
+            # A TileDiffer plan; already scaled
+            if frame[0] == "key":
+                ok, buf = cv2.imencode(".jpg", frame[1], self.encode_param)
+                return ok, buf, FLAG_KEYFRAME
+            buf = encode_delta(*frame[1:], self.tiles.tile, self.encode_param)
+            return buf is not None, buf, FLAG_DELTA
+        scale = self.scale
+        if scale and scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", frame, self.encode_param)
+        return ok, buf, 0
+
+    def _next_encoded(self, number: int) -> Optional[tuple]:
+        """Waits for frame `number`; None once the stream has ended."""
+        with self._ready:
+            while number not in self._done:
+                if self._capture_finished and number >= self._captured:
+                    return None
+                self._ready.wait(0.1)
+            return self._done.pop(number)
+
+    def run(self):
+        """Starts the capture and encoder threads and sends until the source ends or stop()."""
+        self._running.set()
+        threads = [threading.Thread(target=self._capture, name="capture", daemon=True)]
+        threads += [threading.Thread(target=self._encode, name=f"encoder-{i}", daemon=True)
+                    for i in range(self.encoders)]
+        for thread in threads:
+            thread.start()
+
+        number = 0
+        try:
+            while True:
+                item = self._next_encoded(number)
+                if item is None:
+                    break
+                captured_at, buf, flags = item
+                frame_id = number
+                number += 1
+                if buf is None:
+                    self.encode_failed += 1
+                    self._lost_plan()
+                    continue
+
+                send_at = captured_at + self.latency
+                delay = send_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -self.interval:
+                    self.late_dropped += 1
+                    self._lost_plan()
+                    continue
+
+                self.sender.send_frame(frame_id, buf, self.target, flags)
+                self.sent += 1
+                self.bytes_sent += buf.size
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join(timeout=1.0)
+
+    def _lost_plan(self):
+        # The client's picture no longer matches the TileDiffer's reference
+        if self.tiles is not None:
+            self.tiles.force_keyframe()
+
+    def stop(self):
+        """Stops capture; frames already captured are still encoded."""
+        self._running.clear()
+
+    def stats(self) -> dict:
+        stats = {
+            "captured": self._captured + self.capture_dropped,
+            "sent": self.sent,
+            "capture_dropped": self.capture_dropped,
+            "late_dropped": self.late_dropped,
+            "encode_failed": self.encode_failed,
+            "unchanged_skipped": self.unchanged_skipped,
+        }
+        if self.tiles is not None:
+            stats["keyframes"] = self.tiles.keyframes
+            stats["deltas"] = self.tiles.deltas
+        return stats
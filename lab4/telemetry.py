@@ -0,0 +1,147 @@
+from __future__ import annotations
+import json
+import time
+from array import array
+
+import cv2
+import numpy as np
+
+
+class PreEncoded:
+    """A frame that is already JPEG; the encoder stage passes it through."""
+    __slots__ = ("data",)
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+
+
+class SyntheticSource:
+    """
+    A stand-in for cv2.VideoCapture that needs no camera or file: `count`
+    frames (0 = endless) of a moving colour gradient. With `pre_encoded`,
+    a few frames are JPEG-encoded up front and cycled, so a run measures
+    the transport alone.
+    """
+
+    def __init__(self, width: int = 1280, height: int = 720, count: int = 0,
+                 pre_encoded: bool = False, quality: int = 70):
+        self.count = count
+        self.read_frames = 0
+        y, x = np.mgrid[0:height, 0:width]
+        self._base = ((x * 255 // max(1, width - 1)) ^ (y * 255 // max(1, height - 1))).astype(np.uint8)
+        self._encoded = None
+        if pre_encoded:
+            param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+            self._encoded = [PreEncoded(cv2.imencode(".jpg", self._render(i), param)[1]) for i in range(8)]
+
+    def _render(self, index: int) -> np.ndarray:
+        shift = (index * 4) % self._base.shape[1]
+        moved = np.roll(self._base, shift, axis=1)
+        return np.dstack((moved, np.roll(moved, 85, axis=0), 255 - moved))
+
+    def isOpened(self) -> bool:
+        return True
+
+    def get(self, prop) -> float:
+        return 0.0  # no native frame rate
+
+    def read(self):
+        if self.count and self.read_frames >= self.count:
+            return False, None
+        index = self.read_frames
+        self.read_frames += 1
+        if self._encoded is not None:
+            return True, self._encoded[index % len(self._encoded)]
+        return True, self._render(index)
+
+    def release(self):
+        pass
+
+
+def percentiles(values: array) -> dict:
+    """p50/p95/p99/max of a float array, in milliseconds."""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    data = np.frombuffer(values, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(data, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3),
+            "p99": round(float(p99), 3), "max": round(float(data.max()), 3)}
+
+
+class ClientTelemetry:
+    """
+    Per-frame measurements on the client: end-to-end latency from the
+    server's send timestamp (needs the server's --timestamps and a shared
+    clock, e.g. loopback) and the reassembly delay from first packet to
+    completion.
+    """
+
+    def __init__(self):
+        self.latencies = array("d")
+        self.reassembly = array("d")
+        self.bytes = 0
+        self.first = None
+        self.last = None
+
+    def on_frame(self, frame, now: float):
+        if self.first is None:
+            self.first = frame.start_time
+        self.last = now
+        self.bytes += frame.length
+        self.reassembly.append(now - frame.start_time)
+        if frame.sent_at is not None:
+            self.latencies.append(now - frame.sent_at)
+
+    def summary(self, frames, shown: int = 0, decoded: int = 0) -> dict:
+        """JSON-ready summary; `frames` is the client's ReassemblyManager."""
+        duration = (self.last - self.first) if self.first is not None else 0.0
+        return {
+            "duration_s": round(duration, 3),
+            "frames": {
+                "completed": frames.completed,
+                "decoded": decoded,
+                "shown": shown,
+                "dropped_stale": frames.expired,
+                "dropped_window": frames.evicted,
+                "dropped_superseded": frames.superseded,
+                "pending": len(frames.frames),
+            },
+            "packets": {
+                "expected": frames.packets_expected,
+                "received": frames.packets_received,
+                "lost": frames.packets_expected - frames.packets_received,
+                "recovered": frames.recovered,
+                "rejected": frames.rejected,
+            },
+            "fps": round(frames.completed / duration, 2) if duration > 0 else 0.0,
+            "throughput_mbps": round(self.bytes * 8 / duration / 1e6, 3) if duration > 0 else 0.0,
+            "latency_ms": percentiles(self.latencies),
+            "reassembly_ms": percentiles(self.reassembly),
+        }
+
+
+def write_json(summary: dict, path: str):
+    """Writes a summary to `path`, or to stdout for '-'."""
+    text = json.dumps(summary, indent=2)
+    if path == "-":
+        print(text)
+        return
+    with open(path, "w") as f:
+        f.write(text + "\n")
+
+
+def server_summary(pipeline, sender, started: float) -> dict:
+    """JSON-ready summary of a server run."""
+    duration = time.perf_counter() - started
+    stats = pipeline.stats()
+    summary = {
+        "duration_s": round(duration, 3),
+        "frames": stats,
+        "fps": round(stats["sent"] / duration, 2) if duration > 0 else 0.0,
+    }
+    packets = getattr(sender, "packets_sent", None)
+    if packets is not None:
+        summary["packets_sent"] = packets
+        summary["packets_per_s"] = round(packets / duration, 1) if duration > 0 else 0.0
+    summary["encoded_mbps"] = round(pipeline.bytes_sent * 8 / duration / 1e6, 3) if duration > 0 else 0.0
+    return summary